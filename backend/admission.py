@@ -0,0 +1,201 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Hashable, Optional
+
+# Concurrent upstream generations, overall and per user
+ADMISSION_GLOBAL_LIMIT = int(os.getenv("ADMISSION_GLOBAL_LIMIT", "32"))
+ADMISSION_PER_USER_LIMIT = int(os.getenv("ADMISSION_PER_USER_LIMIT", "2"))
+# Waiting requests accepted before new ones are rejected, overall and per user
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "256"))
+ADMISSION_MAX_QUEUE_PER_USER = int(os.getenv("ADMISSION_MAX_QUEUE_PER_USER", "8"))
+# Longest a request may wait for a slot, in seconds
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "60"))
+# Queued requests re-check their position at least this often, in seconds
+ADMISSION_POSITION_INTERVAL = 1.0
+
+# Number of recent queue wait times kept for percentiles
+WAIT_SAMPLES = 1000
+
+
+class AdmissionRejected(Exception):
+    pass
+
+
+class Ticket:
+    """
+    A request's place in the admission queue. Release it exactly once, whether or not it was admitted.
+    """
+
+    def __init__(self, controller: "AdmissionController", user_id: Hashable):
+        self.controller = controller
+        self.user_id = user_id
+        self.enqueued_at = time.monotonic()
+        self.admitted = False
+        self.released = False
+        self._changed = asyncio.Event()
+
+    @property
+    def position(self) -> int:
+        """
+        Estimated number of requests that will be admitted before this one (0 once admitted).
+        """
+        return 0 if self.admitted else self.controller._position(self)
+
+    async def wait_for_change(self, timeout: float) -> None:
+        """
+        Wait until the ticket is admitted or the queue moves, or for at most `timeout` seconds.
+        """
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._changed.clear()
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    """
+    Limits concurrent upstream LLM calls globally and per user. Waiting requests sit in
+    per-user FIFO queues, and free slots are handed out round-robin across users, so a
+    burst from one user cannot starve everyone else.
+    All methods run on the event loop; none of them block.
+    """
+
+    def __init__(
+        self,
+        global_limit: int = ADMISSION_GLOBAL_LIMIT,
+        per_user_limit: int = ADMISSION_PER_USER_LIMIT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        max_queue_per_user: int = ADMISSION_MAX_QUEUE_PER_USER
+    ):
+        self.global_limit = global_limit
+        self.per_user_limit = per_user_limit
+        self.max_queue = max_queue
+        self.max_queue_per_user = max_queue_per_user
+        self._queues: "OrderedDict[Hashable, Deque[Ticket]]" = OrderedDict()
+        self._active: Dict[Hashable, int] = {}
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.abandoned = 0
+        self.peak_queued = 0
+        self._waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+    def enqueue(self, user_id: Hashable) -> Ticket:
+        """
+        Queue a request, admitting it immediately if a slot is free.
+        Raises AdmissionRejected when the queue is full.
+        """
+        queue = self._queues.get(user_id)
+        if self.queued >= self.max_queue or (queue is not None and len(queue) >= self.max_queue_per_user):
+            self.rejected += 1
+            raise AdmissionRejected("Too many requests are waiting; please try again shortly")
+
+        ticket = Ticket(self, user_id)
+        if queue is None:
+            queue = self._queues[user_id] = deque()
+        queue.append(ticket)
+        self.queued += 1
+        self.peak_queued = max(self.peak_queued, self.queued)
+        self._dispatch()
+        return ticket
+
+    def _dispatch(self) -> None:
+        # Hand out free slots, one per eligible user per round
+        moved = False
+        while self.active < self.global_limit:
+            for user_id, queue in self._queues.items():
+                if self._active.get(user_id, 0) < self.per_user_limit:
+                    break
+            else:
+                break
+
+            ticket = queue.popleft()
+            if queue:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            self.queued -= 1
+            self.active += 1
+            self._active[user_id] = self._active.get(user_id, 0) + 1
+            self.admitted += 1
+            self._waits.append(time.monotonic() - ticket.enqueued_at)
+            ticket.admitted = True
+            ticket._changed.set()
+            moved = True
+
+        if moved:
+            # Everyone still waiting moved up
+            for queue in self._queues.values():
+                for ticket in queue:
+                    ticket._changed.set()
+
+    def _position(self, ticket: Ticket) -> int:
+        queue = self._queues.get(ticket.user_id)
+        if not queue:
+            return 0
+        index = queue.index(ticket)
+        # Round-robin admits up to `index` tickets from every other user before this one
+        return index + sum(min(len(other), index + 1) for user_id, other in self._queues.items() if user_id != ticket.user_id)
+
+    def _release(self, ticket: Ticket) -> None:
+        if ticket.admitted:
+            self.active -= 1
+            remaining = self._active[ticket.user_id] - 1
+            if remaining:
+                self._active[ticket.user_id] = remaining
+            else:
+                del self._active[ticket.user_id]
+        else:
+            # Gave up while waiting (disconnect or timeout)
+            queue = self._queues.get(ticket.user_id)
+            if queue is not None and ticket in queue:
+                queue.remove(ticket)
+                if not queue:
+                    del self._queues[ticket.user_id]
+                self.queued -= 1
+                self.abandoned += 1
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+
+        def percentile(pct: float) -> Optional[float]:
+            if not waits:
+                return None
+            return round(waits[min(len(waits) - 1, int(len(waits) * pct / 100))] * 1000, 1)
+
+        return {
+            "global_limit": self.global_limit,
+            "per_user_limit": self.per_user_limit,
+            "active": self.active,
+            "queued": self.queued,
+            "peak_queued": self.peak_queued,
+            "users_waiting": len(self._queues),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "abandoned": self.abandoned,
+            "wait_p50_ms": percentile(50),
+            "wait_p95_ms": percentile(95),
+            "wait_max_ms": round(waits[-1] * 1000, 1) if waits else None,
+        }
+
+
+_admission_controller = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """
+    Get or create the shared admission controller.
+    """
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController()
+    return _admission_controller
@@ -1,15 +1,28 @@
 import os
 import logging
 import asyncio
-import httpx
 import json
-from typing import List, Dict, Any, AsyncGenerator, Optional
-import PyPDF2
+import time
+import random
+from contextlib import AsyncExitStack, aclosing
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import List, Dict, Any, AsyncGenerator, Optional, Tuple, Awaitable
 import tempfile
-from langdetect import detect
+import httpx
 from dotenv import load_dotenv
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
 
-from vector_db import add_document_to_chroma, query_chroma
+from vector_db import query_documents
+from ingestion import ingest_pdf
+from http_clients import get_http_client
+from semantic_cache import get_semantic_cache, context_fingerprint, split_for_replay
+from search_cache import get_search_cache
+from tokens import count_tokens
+from metrics import (
+    LLM_TIME_TO_FIRST_TOKEN_SECONDS, LLM_TOKENS, LLM_TOKENS_PER_SECOND, TAVILY_SECONDS,
+    start_span, end_span
+)
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -22,7 +35,25 @@ GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 
 # API endpoints
-GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_API_URL = os.getenv("GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+TAVILY_API_URL = os.getenv("TAVILY_API_URL", "https://api.tavily.com/search")
+
+# Retries of rate-limited or overloaded upstream calls, with jittered exponential backoff (seconds)
+GROQ_MAX_ATTEMPTS = int(os.getenv("GROQ_MAX_ATTEMPTS", "4"))
+GROQ_RETRY_BASE_DELAY = float(os.getenv("GROQ_RETRY_BASE_DELAY", "0.5"))
+GROQ_RETRY_MAX_DELAY = float(os.getenv("GROQ_RETRY_MAX_DELAY", "20"))
+RETRYABLE_STATUS_CODES = {429, 503}
+
+# Upper bound on generated tokens per reply
+GROQ_MAX_TOKENS = int(os.getenv("GROQ_MAX_TOKENS", "4000"))
+
+# Deadlines (seconds) for the retrieval stages that run before generation
+SEARCH_DEADLINE_SECONDS = float(os.getenv("SEARCH_DEADLINE_SECONDS", "8"))
+PDF_DEADLINE_SECONDS = float(os.getenv("PDF_DEADLINE_SECONDS", "5"))
+
+# Messages yielded in place of a model answer; these are never cached
+API_KEY_MISSING_MESSAGE = "API key not configured. Please set the GROQ_API_KEY environment variable."
+ERROR_MESSAGE_PREFIX = "I'm sorry, an error occurred"
 
 # Check if API keys are set
 if not GROQ_API_KEY:
@@ -30,6 +61,86 @@ if not GROQ_API_KEY:
 if not TAVILY_API_KEY:
     logger.warning("TAVILY_API_KEY is not set. Web search will not work.")
 
+class UpstreamBusyError(Exception):
+    """
+    The upstream answered 429 or 503; `retry_after` is its Retry-After hint in seconds, if any.
+    """
+
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"Upstream returned {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+_exponential_backoff = wait_random_exponential(multiplier=GROQ_RETRY_BASE_DELAY, max=GROQ_RETRY_MAX_DELAY)
+
+def _retry_wait(retry_state) -> float:
+    """
+    Full-jitter exponential backoff, or the upstream's Retry-After plus jitter when it sent one.
+    """
+    error = retry_state.outcome.exception()
+    if isinstance(error, UpstreamBusyError) and error.retry_after is not None:
+        return min(error.retry_after, GROQ_RETRY_MAX_DELAY) + random.uniform(0, GROQ_RETRY_BASE_DELAY)
+    return _exponential_backoff(retry_state)
+
+_upstream_retries = {"retries": 0, "gave_up": 0}
+
+async def _open_groq_stream(payload: Dict[str, Any]) -> Tuple[AsyncExitStack, httpx.Response]:
+    """
+    Open a streaming completion request; raises UpstreamBusyError on 429/503 so it can be retried.
+    Returns the response and the exit stack that closes it.
+    """
+    stack = AsyncExitStack()
+    response = await stack.enter_async_context(get_http_client("groq").stream(
+        "POST",
+        GROQ_API_URL,
+        headers={
+            "Authorization": f"Bearer {GROQ_API_KEY}",
+            "Content-Type": "application/json"
+        },
+        json=payload,
+    ))
+    if response.status_code in RETRYABLE_STATUS_CODES:
+        retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+        await stack.aclose()
+        raise UpstreamBusyError(response.status_code, retry_after)
+    return stack, response
+
+def _before_retry_sleep(retry_state) -> None:
+    _upstream_retries["retries"] += 1
+    logger.warning(f"Groq busy ({retry_state.outcome.exception()}); retrying in {retry_state.next_action.sleep:.2f}s")
+
+async def open_groq_stream(payload: Dict[str, Any]) -> Tuple[AsyncExitStack, httpx.Response]:
+    """
+    Open a streaming completion request, retrying 429/503 responses before any token is read.
+    """
+    retrying = AsyncRetrying(
+        stop=stop_after_attempt(GROQ_MAX_ATTEMPTS),
+        wait=_retry_wait,
+        retry=retry_if_exception_type(UpstreamBusyError),
+        before_sleep=_before_retry_sleep,
+        reraise=True,
+    )
+    try:
+        return await retrying(_open_groq_stream, payload)
+    except UpstreamBusyError:
+        _upstream_retries["gave_up"] += 1
+        raise
+
+def get_upstream_retry_stats() -> Dict[str, int]:
+    return dict(_upstream_retries)
+
 async def generate_response(
     message: str,
     history: List[Dict[str, str]],
@@ -41,7 +152,7 @@ async def generate_response(
     """
     try:
         if not GROQ_API_KEY:
-            yield "API key not configured. Please set the GROQ_API_KEY environment variable."
+            yield API_KEY_MISSING_MESSAGE
             return
         
         # Prepare system message with context if available
@@ -60,139 +171,267 @@ async def generate_response(
         messages = [{"role": "system", "content": system_message}]
         messages.extend(history)
         
-        # Make API request
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                GROQ_API_URL,
-                headers={
-                    "Authorization": f"Bearer {GROQ_API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "llama3-70b-8192",  # Using Llama 3 70B model
-                    "messages": messages,
-                    "temperature": 0.7,
-                    "max_tokens": 4000,
-                    "stream": True
-                },
+        started = time.perf_counter()
+        first_token_at = None
+        tokens = 0
+        span = start_span("llm.generate", model="llama3-70b-8192")
+
+        try:
+            # Make API request over the shared, pooled client, backing off while the upstream is busy
+            stack, response = await open_groq_stream({
+                "model": "llama3-70b-8192",  # Using Llama 3 70B model
+                "messages": messages,
+                "temperature": 0.7,
+                "max_tokens": GROQ_MAX_TOKENS,
+                "stream": True
+            })
+            async with stack:
+                response.raise_for_status()
+                
+                # Process streaming response (SSE format, one event per line)
+                buffer = ""
+                async for line in response.aiter_lines():
+                    if line.startswith("data: ") and line != "data: [DONE]":
+                        data = line[6:]  # Remove "data: " prefix
+                        
+                        try:
+                            json_data = json.loads(data)
+                            if "choices" in json_data and json_data["choices"]:
+                                delta = json_data["choices"][0].get("delta", {})
+                                if "content" in delta:
+                                    content = delta["content"]
+                                    if first_token_at is None:
+                                        first_token_at = time.perf_counter()
+                                        LLM_TIME_TO_FIRST_TOKEN_SECONDS.observe(first_token_at - started)
+                                    tokens += 1
+                                    buffer += content
+                                    yield content
+                        except Exception as e:
+                            logger.error(f"Error parsing JSON: {str(e)}")
+        finally:
+            # Also runs when the client disconnects and the generator is closed mid-stream
+            LLM_TOKENS.inc(tokens)
+            generation_time = time.perf_counter() - first_token_at if first_token_at is not None else 0
+            if tokens > 1 and generation_time > 0:
+                LLM_TOKENS_PER_SECOND.observe((tokens - 1) / generation_time)
+            end_span(
+                span,
+                tokens=tokens,
+                time_to_first_token=first_token_at - started if first_token_at is not None else -1
             )
-            
-            response.raise_for_status()
-            
-            # Process streaming response
-            buffer = ""
-            async for chunk in response.aiter_bytes():
-                try:
-                    chunk_str = chunk.decode("utf-8")
-                    
-                    # Handle SSE format
-                    for line in chunk_str.split("\n"):
-                        if line.startswith("data: ") and line != "data: [DONE]":
-                            data = line[6:]  # Remove "data: " prefix
-                            
-                            try:
-                                json_data = json.loads(data)
-                                if "choices" in json_data and json_data["choices"]:
-                                    delta = json_data["choices"][0].get("delta", {})
-                                    if "content" in delta:
-                                        content = delta["content"]
-                                        buffer += content
-                                        yield content
-                            except Exception as e:
-                                logger.error(f"Error parsing JSON: {str(e)}")
-                except Exception as e:
-                    logger.error(f"Error processing chunk: {str(e)}")
     
     except Exception as e:
         logger.error(f"Error generating response: {str(e)}")
-        yield f"I'm sorry, an error occurred: {str(e)}"
+        yield f"{ERROR_MESSAGE_PREFIX}: {str(e)}"
+
+async def generate_cached_response(
+    message: str,
+    history: List[Dict[str, str]],
+    search_results: Optional[List[Dict[str, str]]] = None,
+    pdf_context: Optional[str] = None
+) -> AsyncGenerator[str, None]:
+    """
+    Generate a streaming response, replaying a semantically similar cached answer when one exists.
+    """
+    cache = get_semantic_cache()
+    if cache is None:
+        # aclosing: closing this generator early also closes the upstream request
+        async with aclosing(generate_response(message, history, search_results=search_results, pdf_context=pdf_context)) as upstream:
+            async for chunk in upstream:
+                yield chunk
+        return
+    
+    # The last history entry is the prompt itself; it is matched by embedding, not by hash
+    fingerprint = context_fingerprint(history[:-1], search_results, pdf_context)
+    embedding = None
+    try:
+        embedding = await cache.embed(message)
+        cached_answer = cache.lookup(embedding, fingerprint)
+    except Exception as e:
+        logger.error(f"Semantic cache lookup error: {str(e)}")
+        cached_answer = None
+    
+    if cached_answer is not None:
+        for chunk in split_for_replay(cached_answer):
+            yield chunk
+        return
+    
+    answer = ""
+    async with aclosing(generate_response(message, history, search_results=search_results, pdf_context=pdf_context)) as upstream:
+        async for chunk in upstream:
+            answer += chunk
+            yield chunk
+    
+    if embedding is not None and answer and answer != API_KEY_MISSING_MESSAGE and not answer.startswith(ERROR_MESSAGE_PREFIX):
+        cache.store(embedding, fingerprint, answer)
+
+# Streams that ended normally or were cut short by a client disconnect
+_stream_stats = {"completed": 0, "cancelled": 0, "cancelled_tokens": 0, "unused_token_budget": 0}
+_closing_upstreams = set()
+
+def cancel_upstream(upstream: Optional[AsyncGenerator[str, None]], partial_response: str) -> None:
+    """
+    Close a response generator whose client went away and account for the tokens involved.
+    `upstream` is None when the client left before generation started (during retrieval or
+    the admission wait). Safe to call from a cancelled task: closing runs in its own task,
+    so the upstream HTTP request is aborted even though the caller can no longer await.
+    """
+    _stream_stats["cancelled"] += 1
+    if upstream is None:
+        return
+    
+    task = asyncio.create_task(upstream.aclose())
+    _closing_upstreams.add(task)
+    task.add_done_callback(_closing_upstreams.discard)
+    
+    generated = count_tokens(partial_response)
+    # Tokens paid for but never read, and the most the upstream would still have generated
+    _stream_stats["cancelled_tokens"] += generated
+    _stream_stats["unused_token_budget"] += max(0, GROQ_MAX_TOKENS - generated)
+
+def record_completed_stream() -> None:
+    _stream_stats["completed"] += 1
+
+def get_stream_stats() -> Dict[str, Any]:
+    return dict(_stream_stats)
 
 async def search_web(query: str) -> List[Dict[str, str]]:
     """
-    Search the web using Tavily API.
+    Search the web using Tavily API, sharing cached and in-flight results between callers.
     """
     try:
-        if not TAVILY_API_KEY:
-            logger.error("TAVILY_API_KEY is not set. Web search will not work.")
-            return []
-        
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://api.tavily.com/search",
-                headers={
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "api_key": TAVILY_API_KEY,
-                    "query": query,
-                    "search_depth": "advanced",
-                    "include_domains": [],
-                    "exclude_domains": [],
-                    "max_results": 5
-                }
-            )
-            
-            response.raise_for_status()
-            data = response.json()
-            
-            # Format results
-            results = []
-            for result in data.get("results", []):
-                results.append({
-                    "title": result.get("title", ""),
-                    "content": result.get("content", ""),
-                    "url": result.get("url", "")
-                })
-            
-            return results
+        return await _fetch_search(query)
     
     except Exception as e:
         logger.error(f"Error searching web: {str(e)}")
         return []
 
-async def process_pdf(pdf_id: str, file_path: str) -> None:
+async def _fetch_search(query: str) -> List[Dict[str, str]]:
     """
-    Process a PDF file and add it to the vector database.
+    Like search_web, but errors are raised so a failed retrieval stage is reported as such.
     """
-    try:
-        # Extract text from PDF
-        with open(file_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            text = ""
-            
-            for page_num in range(len(reader.pages)):
-                page = reader.pages[page_num]
-                text += page.extract_text() + "\n\n"
-        
-        # Detect language
-        try:
-            language = detect(text[:1000])  # Use first 1000 chars for detection
-        except:
-            language = "en"  # Default to English if detection fails
-        
-        # Add to vector database
-        await add_document_to_chroma(pdf_id, text, {"source": file_path, "language": language})
-        
-        logger.info(f"PDF {pdf_id} processed and added to vector database")
+    if not TAVILY_API_KEY:
+        raise RuntimeError("TAVILY_API_KEY is not set. Web search will not work.")
     
-    except Exception as e:
-        logger.error(f"Error processing PDF {pdf_id}: {str(e)}")
+    return await get_search_cache().get_or_fetch(query, _search_tavily)
 
-async def query_pdf(pdf_id: str, query: str) -> str:
+async def _search_tavily(query: str) -> List[Dict[str, str]]:
     """
-    Query the vector database for relevant content from a PDF.
+    Send a single search request to Tavily. Errors are raised so they are never cached.
     """
+    client = get_http_client("tavily")
+    started = time.perf_counter()
+    span = start_span("tavily.search")
+    outcome = "error"
     try:
-        results = await query_chroma(pdf_id, query, top_k=5)
-        
-        if not results:
-            return "No relevant information found in the document."
+        response = await client.post(
+            TAVILY_API_URL,
+            headers={
+                "Content-Type": "application/json"
+            },
+            json={
+                "api_key": TAVILY_API_KEY,
+                "query": query,
+                "search_depth": "advanced",
+                "include_domains": [],
+                "exclude_domains": [],
+                "max_results": 5
+            }
+        )
         
-        # Combine results into a single context string
-        context = "\n\n".join([f"Excerpt {i+1}:\n{doc}" for i, doc in enumerate(results)])
-        
-        return context
+        response.raise_for_status()
+        data = response.json()
+        outcome = "ok"
+    finally:
+        TAVILY_SECONDS.observe(time.perf_counter() - started, outcome=outcome)
+        end_span(span, outcome=outcome)
+    
+    # Format results
+    results = []
+    for result in data.get("results", []):
+        results.append({
+            "title": result.get("title", ""),
+            "content": result.get("content", ""),
+            "url": result.get("url", "")
+        })
     
+    return results
+
+async def process_pdf(pdf_id: str, file_path: str, content_hash: Optional[str] = None) -> None:
+    """
+    Process a PDF file and add it to the vector database.
+    """
+    await ingest_pdf(pdf_id, file_path, content_hash)
+
+async def query_pdfs(
+    pdf_sources: Dict[str, str],
+    query: str,
+    retrieval: Optional[str] = None,
+    failed: Optional[List[str]] = None
+) -> str:
+    """
+    Query the vector database for relevant content from one or more PDFs.
+    `pdf_sources` maps each PDF's vector index id (see models.PDF.index_id) to its filename;
+    `retrieval` selects "vector" or "hybrid" retrieval and defaults to RETRIEVAL_MODE.
+    Errors are raised, so they never reach the prompt as document content; index ids
+    that could not be searched while others could are appended to `failed`.
+    """
+    results = await query_documents(list(pdf_sources), query, top_k=5, mode=retrieval, failed=failed)
+    
+    if not results:
+        return "No relevant information found in the document."
+    
+    # Combine results into a single context string, naming the source when there are several
+    if len(pdf_sources) == 1:
+        excerpts = [f"Excerpt {i+1}:\n{doc}" for i, (_, doc) in enumerate(results)]
+    else:
+        excerpts = [f"Excerpt {i+1} ({pdf_sources[index_id]}):\n{doc}" for i, (index_id, doc) in enumerate(results)]
+    
+    return "\n\n".join(excerpts)
+
+async def _run_stage(name: str, stage: Awaitable, deadline: float, timings: Dict[str, Dict[str, Any]]) -> Any:
+    """
+    Await a retrieval stage within its deadline and record how long it took.
+    Returns None if the stage timed out or failed.
+    """
+    started = time.perf_counter()
+    result = None
+    try:
+        result = await asyncio.wait_for(stage, timeout=deadline)
+        status = "ok"
+    except asyncio.TimeoutError:
+        logger.warning(f"Retrieval stage {name} missed its {deadline}s deadline")
+        status = "timeout"
     except Exception as e:
-        logger.error(f"Error querying PDF {pdf_id}: {str(e)}")
-        return f"Error retrieving information from the document: {str(e)}"
+        logger.error(f"Retrieval stage {name} error: {str(e)}")
+        status = "error"
+    timings[name] = {"ms": round((time.perf_counter() - started) * 1000, 1), "status": status}
+    return result
+
+async def retrieve_context(
+    message: str,
+    pdf_sources: Optional[Dict[str, str]] = None,
+    search: bool = False,
+    retrieval: Optional[str] = None
+) -> Tuple[Optional[List[Dict[str, str]]], Optional[str], Dict[str, Dict[str, Any]]]:
+    """
+    Run web search and PDF retrieval concurrently. Stages that miss their deadline
+    are dropped so generation can start with whatever context is ready.
+    """
+    timings: Dict[str, Dict[str, Any]] = {}
+    search_stage = _run_stage("search", _fetch_search(message), SEARCH_DEADLINE_SECONDS, timings) if search else None
+    failed_pdfs: List[str] = []
+    pdf_stage = _run_stage("pdf", query_pdfs(pdf_sources, message, retrieval, failed_pdfs), PDF_DEADLINE_SECONDS, timings) if pdf_sources else None
+    
+    stages = [stage for stage in (search_stage, pdf_stage) if stage is not None]
+    results = iter(await asyncio.gather(*stages))
+    search_results = next(results) if search_stage else None
+    if search_stage and search_results is None:
+        # Failed or late: the client still gets an (empty) search_results event
+        search_results = []
+    pdf_context = next(results) if pdf_stage else None
+    if failed_pdfs and timings["pdf"]["status"] == "ok":
+        # Answered from the other PDFs; name the ones that could not be searched
+        timings["pdf"].update(status="partial", failed=[pdf_sources[index_id] for index_id in failed_pdfs])
+    
+    return search_results, pdf_context, timings
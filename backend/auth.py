@@ -1,5 +1,11 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Dict, Any
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
@@ -7,14 +13,22 @@ from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 import os
 
-from database import get_db
+from database import get_db, run_db
 import models
+import schemas
 
 # Configuration
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-for-development")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 1 week
 
+# Verified token -> user identity cache
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+# Threads running bcrypt; each hash takes ~250 ms of CPU
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -28,6 +42,31 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+_password_executor = None
+
+def get_password_executor() -> ThreadPoolExecutor:
+    """
+    Get or create the thread pool used for bcrypt, so hashing never blocks the event loop.
+    """
+    global _password_executor
+    if _password_executor is None:
+        _password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _password_executor
+
+def shutdown_password_executor() -> None:
+    global _password_executor
+    if _password_executor is not None:
+        _password_executor.shutdown(wait=False, cancel_futures=True)
+        _password_executor = None
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_password_executor(), verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_password_executor(), get_password_hash, password)
+
 # Token functions
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -42,6 +81,90 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     
     return encoded_jwt
 
+class TokenCache:
+    """
+    Short-lived, size-bounded cache of verified tokens and the user they identify.
+    Entries never outlive the token's own expiry. Keys are SHA-256 digests, so raw tokens are not kept in memory.
+    No route changes or removes users yet; one that does must also drop that user's cached tokens.
+    """
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL, max_entries: int = AUTH_CACHE_MAX_ENTRIES):
+        self._entries = TTLCache(maxsize=max_entries, ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[schemas.User]:
+        with self._lock:
+            entry = self._entries.get(self._key(token))
+        if entry is None or entry[1] <= time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def put(self, token: str, user: schemas.User, expires_at: float) -> None:
+        with self._lock:
+            self._entries[self._key(token)] = (user, expires_at)
+
+    def invalidate_token(self, token: str) -> None:
+        with self._lock:
+            if self._entries.pop(self._key(token), None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+        }
+
+
+_token_cache = None
+
+def get_token_cache() -> TokenCache:
+    """
+    Get or create the shared token cache.
+    """
+    global _token_cache
+    if _token_cache is None:
+        _token_cache = TokenCache()
+    return _token_cache
+
+async def resolve_token(token: str, db: Session) -> schemas.User:
+    """
+    Verify a JWT and return the user it belongs to, from the token cache when possible.
+    Raises a 401 HTTPException describing what was wrong with the token.
+    """
+    cache = get_token_cache()
+    user = cache.get(token)
+    if user is not None:
+        return user
+    
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token") from e
+    
+    email: str = payload.get("sub")
+    if email is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
+    
+    db_user = await run_db(lambda: db.query(models.User).filter(models.User.email == email).first())
+    if db_user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    
+    # Cache an immutable snapshot rather than the session-bound ORM object
+    user = schemas.User.from_orm(db_user)
+    cache.put(token, user, float(payload.get("exp", time.time() + AUTH_CACHE_TTL)))
+    return user
+
 # User authentication
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
@@ -51,17 +174,6 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     )
     
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        
-        if email is None:
-            raise credentials_exception
-    except JWTError:
+        return await resolve_token(token, db)
+    except HTTPException:
         raise credentials_exception
-    
-    user = db.query(models.User).filter(models.User.email == email).first()
-    
-    if user is None:
-        raise credentials_exception
-    
-    return user
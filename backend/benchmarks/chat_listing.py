@@ -0,0 +1,140 @@
+"""
+Payload size and query count of chat listing for a heavy user.
+
+Creates a temporary SQLite database with one user owning N chats of M messages
+each, then serializes the sidebar listing the way each endpoint does:
+- legacy:     GET /chats before this change (messages lazy-loaded per chat)
+- eager:      GET /chats now (messages loaded with one extra query)
+- summaries:  first page of GET /chats/summaries, and a walk over all pages
+- history:    latest page of GET /chats/{id}/history
+
+Usage (from backend/):
+    python -m benchmarks.chat_listing --chats 5000 --messages 20
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Point the app at a throwaway database before importing it
+_tmpdir = tempfile.mkdtemp(prefix="chat_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.orm import selectinload  # noqa: E402
+
+import models  # noqa: E402
+import schemas  # noqa: E402
+from chat_pages import list_chat_summaries, list_messages  # noqa: E402
+from database import SessionLocal, engine, migrate_schema  # noqa: E402
+
+_queries = [0]
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    _queries[0] += 1
+
+
+def setup(chats, messages):
+    migrate_schema()
+    db = SessionLocal()
+    try:
+        user = models.User(username="heavy", email="heavy@example.com", hashed_password="x")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+        db.bulk_insert_mappings(models.Chat, [{"title": f"Chat {i}", "user_id": user_id} for i in range(chats)])
+        db.commit()
+        chat_ids = [row.id for row in db.query(models.Chat.id).all()]
+        content = "A typical assistant reply with a few sentences of text. " * 8
+        for chat_id in chat_ids:
+            db.bulk_insert_mappings(models.Message, [
+                {"chat_id": chat_id, "role": "user" if i % 2 == 0 else "assistant", "content": content}
+                for i in range(messages)
+            ])
+        db.commit()
+        return user_id, chat_ids
+    finally:
+        db.close()
+
+
+def measure(name, fn):
+    db = SessionLocal()
+    try:
+        _queries[0] = 0
+        started = time.perf_counter()
+        payload = fn(db)
+        elapsed = time.perf_counter() - started
+        return {
+            "endpoint": name,
+            "queries": _queries[0],
+            "payload_kb": round(len(payload) / 1024, 1),
+            "ms": round(elapsed * 1000, 1),
+        }
+    finally:
+        db.close()
+
+
+def dump(items):
+    return "[" + ",".join(item.model_dump_json() for item in items) + "]"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=5000)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args()
+
+    user_id, chat_ids = setup(args.chats, args.messages)
+
+    def legacy(db):
+        chats = db.query(models.Chat).filter(models.Chat.user_id == user_id).order_by(models.Chat.updated_at.desc()).all()
+        return dump(schemas.Chat.from_orm(chat) for chat in chats)
+
+    def eager(db):
+        chats = (
+            db.query(models.Chat)
+            .options(selectinload(models.Chat.messages))
+            .filter(models.Chat.user_id == user_id)
+            .order_by(models.Chat.updated_at.desc())
+            .all()
+        )
+        return dump(schemas.Chat.from_orm(chat) for chat in chats)
+
+    def summaries_first_page(db):
+        chats, next_cursor = list_chat_summaries(db, user_id, args.page_size)
+        return schemas.ChatPage(items=[schemas.ChatSummary.from_orm(c) for c in chats], next_cursor=next_cursor).model_dump_json()
+
+    def summaries_all_pages(db):
+        payload, cursor, seen = "", None, 0
+        while True:
+            chats, cursor = list_chat_summaries(db, user_id, args.page_size, cursor)
+            seen += len(chats)
+            payload += schemas.ChatPage(items=[schemas.ChatSummary.from_orm(c) for c in chats], next_cursor=cursor).model_dump_json()
+            if cursor is None:
+                break
+        assert seen == args.chats, f"walked {seen} chats, expected {args.chats}"
+        return payload
+
+    def history_latest_page(db):
+        messages, before_id = list_messages(db, chat_ids[-1], None, args.page_size)
+        return schemas.MessagePage(items=[schemas.Message.from_orm(m) for m in messages], next_before_id=before_id).model_dump_json()
+
+    results = [
+        measure("legacy /chats", legacy),
+        measure("/chats", eager),
+        measure("/chats/summaries (first page)", summaries_first_page),
+        measure("/chats/summaries (all pages)", summaries_all_pages),
+        measure("/chats/{id}/history (latest page)", history_latest_page),
+    ]
+    print(json.dumps({"chats": args.chats, "messages_per_chat": args.messages, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Throughput benchmark for the text chunker.
+
+Generates large synthetic documents shaped like PyPDF2 output (single newlines,
+no blank lines) and compares the legacy paragraph splitter with TextChunker:
+MB/s, number of chunks, and how many chunks exceed the embedding window when
+counted with the real tokenizer.
+
+Usage (from backend/):
+    python -m benchmarks.chunking_throughput --sizes-mb 1,10,50
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import TextChunker, token_spans, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS  # noqa: E402
+
+WORDS = (
+    "the supplier shall deliver goods within thirty days of the purchase order section clause "
+    "payment terms invoice warranty part number ABX-1042 firmware v2.3.1 voltage torque "
+    "maintenance schedule replace filter every months inspection safety notice"
+).split()
+
+
+def synthetic_text(size_bytes, seed=0):
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size_bytes:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + "."
+        line = sentence if rng.random() < 0.7 else sentence + " " + sentence
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines)
+
+
+def legacy_split_text(text, max_tokens=1000):
+    # The original vector_db.split_text, kept here for comparison
+    paragraphs = [p for p in text.split("\n\n") if p.strip()]
+    chunks, current_chunk, current_size = [], [], 0
+    for paragraph in paragraphs:
+        paragraph_size = len(paragraph) // 4
+        if current_size + paragraph_size > max_tokens and current_chunk:
+            chunks.append("\n\n".join(current_chunk))
+            current_chunk, current_size = [paragraph], paragraph_size
+        else:
+            current_chunk.append(paragraph)
+            current_size += paragraph_size
+    if current_chunk:
+        chunks.append("\n\n".join(current_chunk))
+    return chunks
+
+
+def measure(name, split, text, max_tokens):
+    started = time.perf_counter()
+    chunks = split(text)
+    elapsed = time.perf_counter() - started
+    sizes = [len(token_spans(chunk)[0]) for chunk in chunks]
+    return {
+        "splitter": name,
+        "seconds": round(elapsed, 3),
+        "mb_per_sec": round(len(text) / (1024 * 1024) / elapsed, 2) if elapsed else None,
+        "chunks": len(chunks),
+        "max_chunk_tokens": max(sizes) if sizes else 0,
+        "chunks_over_window": sum(1 for size in sizes if size > max_tokens),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mb", default="1,10")
+    parser.add_argument("--max-tokens", type=int, default=CHUNK_MAX_TOKENS)
+    parser.add_argument("--overlap", type=int, default=CHUNK_OVERLAP_TOKENS)
+    args = parser.parse_args()
+
+    chunker = TextChunker(args.max_tokens, args.overlap)
+    results = []
+    for size in args.sizes_mb.split(","):
+        text = synthetic_text(int(float(size) * 1024 * 1024))
+        results.append({
+            "size_mb": float(size),
+            "legacy": measure("legacy", legacy_split_text, text, args.max_tokens),
+            "token_aware": measure("token_aware", chunker.split, text, args.max_tokens),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
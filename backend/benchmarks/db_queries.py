@@ -0,0 +1,153 @@
+"""
+Before/after benchmark for the database storage profile.
+
+Builds two identical SQLite databases. The "baseline" one has only the original
+single-column indexes and is opened with SQLite defaults (rollback journal,
+synchronous=FULL, no mmap); the "tuned" one has the composite indexes and is
+opened through database.create_db_engine (WAL, synchronous=NORMAL, mmap). It
+then times the hot read queries, shows their query plans, and measures commit
+throughput from concurrent writer threads.
+
+Usage (from backend/):
+    python -m benchmarks.db_queries --users 200 --chats 50 --messages 20
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, insert, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import models  # noqa: E402
+from database import Base, create_db_engine  # noqa: E402
+
+COMPOSITE_INDEXES = ["ix_chats_user_id_updated_at_id", "ix_messages_chat_id_id", "ix_pdfs_user_id_created_at"]
+
+QUERIES = {
+    "chat_list": (
+        "SELECT id, title, updated_at FROM chats WHERE user_id = :user_id "
+        "ORDER BY updated_at DESC, id DESC LIMIT 50"
+    ),
+    "history_page": (
+        "SELECT id, role, content FROM messages WHERE chat_id = :chat_id AND id < :before_id "
+        "ORDER BY id DESC LIMIT 50"
+    ),
+    "context_load": (
+        "SELECT id, role, content FROM messages WHERE chat_id = :chat_id AND id > 0 AND id < :before_id "
+        "ORDER BY id LIMIT 200"
+    ),
+    "recent_pdfs": (
+        "SELECT id, filename FROM pdfs WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 8"
+    ),
+}
+
+
+def populate(db_engine, users, chats, messages):
+    Base.metadata.create_all(bind=db_engine)
+    content = "A typical chat message with a sentence or two of text. " * 4
+    with db_engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"id": u + 1, "username": f"user{u}", "email": f"user{u}@example.com", "hashed_password": "x"}
+            for u in range(users)
+        ])
+        conn.execute(insert(models.PDF), [
+            {"id": f"pdf-{u}-{p}", "filename": f"manual{p}.pdf", "path": "", "user_id": u + 1}
+            for u in range(users) for p in range(10)
+        ])
+        # Interleave chats of different users, as they are created in production
+        chat_rows = [{"id": c * users + u + 1, "title": f"Chat {c}", "user_id": u + 1} for c in range(chats) for u in range(users)]
+        conn.execute(insert(models.Chat), chat_rows)
+        # Interleave messages across chats, as concurrent conversations produce them
+        for m in range(messages):
+            conn.execute(insert(models.Message), [
+                {"chat_id": row["id"], "role": "user" if m % 2 == 0 else "assistant", "content": content}
+                for row in chat_rows
+            ])
+
+
+def time_queries(db_engine, users, chats, repeats):
+    rng = random.Random(0)
+    total_chats = users * chats
+    results = {}
+    with db_engine.connect() as conn:
+        for name, sql in QUERIES.items():
+            plan = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), {"user_id": 1, "chat_id": 1, "before_id": 10 ** 9}).fetchall()
+            latencies = []
+            for _ in range(repeats):
+                params = {"user_id": rng.randint(1, users), "chat_id": rng.randint(1, total_chats), "before_id": 10 ** 9}
+                started = time.perf_counter()
+                conn.execute(text(sql), params).fetchall()
+                latencies.append(time.perf_counter() - started)
+            results[name] = {
+                "p50_us": round(statistics.median(latencies) * 1_000_000, 1),
+                "p95_us": round(sorted(latencies)[int(len(latencies) * 0.95)] * 1_000_000, 1),
+                "plan": " | ".join(row[-1] for row in plan),
+            }
+    return results
+
+
+def time_writes(db_engine, threads, commits):
+    def writer(seed):
+        for i in range(commits):
+            with db_engine.begin() as conn:
+                conn.execute(insert(models.Message), {"chat_id": seed + 1, "role": "assistant", "content": f"reply {i}"})
+
+    workers = [threading.Thread(target=writer, args=(t,)) for t in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    return {"threads": threads, "commits": threads * commits, "commits_per_sec": round(threads * commits / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--repeats", type=int, default=500)
+    parser.add_argument("--writer-threads", type=int, default=8)
+    parser.add_argument("--commits", type=int, default=100)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="db_queries_bench_") as directory:
+        for profile in ("baseline", "tuned"):
+            url = f"sqlite:///{os.path.join(directory, profile + '.db')}"
+            if profile == "baseline":
+                db_engine = create_engine(url, connect_args={"check_same_thread": False}, pool_size=args.writer_threads)
+            else:
+                db_engine = create_db_engine(url)
+
+            populate(db_engine, args.users, args.chats, args.messages)
+            if profile == "baseline":
+                with db_engine.begin() as conn:
+                    for name in COMPOSITE_INDEXES:
+                        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+            with db_engine.begin() as conn:
+                conn.execute(text("ANALYZE"))
+
+            results[profile] = {
+                "queries": time_queries(db_engine, args.users, args.chats, args.repeats),
+                "writes": time_writes(db_engine, args.writer_threads, args.commits),
+            }
+            db_engine.dispose()
+
+    print(json.dumps({
+        "chats": args.users * args.chats,
+        "messages": args.users * args.chats * args.messages,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
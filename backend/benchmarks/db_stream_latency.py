@@ -0,0 +1,137 @@
+"""
+Load test for database access from streaming routes.
+
+Simulates N concurrent chat turns against a temporary SQLite database. Each turn
+performs the same database work as GET /chats/{id}/messages (user message, title
+update, assistant placeholder and history read in one transaction, then the
+session is released), streams a fixed number of chunks at a fixed interval, and
+writes the reply from a fresh session. The lateness of every chunk relative to its schedule
+is recorded, so any blocking database call on the event loop shows up as stream
+latency for every other open chat.
+
+Usage (from backend/):
+    python -m benchmarks.db_stream_latency --chats 200 --mode both
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Point the app at a throwaway database before importing it
+_tmpdir = tempfile.mkdtemp(prefix="db_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+from database import SessionLocal, engine, Base, run_db, shutdown_db_executor  # noqa: E402
+import models  # noqa: E402
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def setup_chats(count):
+    db = SessionLocal()
+    try:
+        user = models.User(username="bench", email="bench@example.com", hashed_password="x")
+        db.add(user)
+        db.commit()
+        chats = [models.Chat(title="New Chat", user_id=user.id) for _ in range(count)]
+        db.add_all(chats)
+        db.commit()
+        return [chat.id for chat in chats]
+    finally:
+        db.close()
+
+
+def prepare_turn(db, chat_id):
+    # Same shape as the route: one transaction, then the session is released before streaming
+    try:
+        chat = db.query(models.Chat).filter(models.Chat.id == chat_id).first()
+        db.add(models.Message(chat_id=chat_id, role="user", content="hello"))
+        if chat.title == "New Chat":
+            chat.title = "hello"
+        assistant = models.Message(chat_id=chat_id, role="assistant", content="")
+        db.add(assistant)
+        db.flush()
+        assistant_id = assistant.id
+        db.query(models.Message).filter(models.Message.chat_id == chat_id, models.Message.id < assistant_id).order_by(models.Message.id).all()
+        db.commit()
+        return assistant_id
+    finally:
+        db.close()
+
+
+def finish_turn(db, assistant_id, content):
+    try:
+        db.query(models.Message).filter(models.Message.id == assistant_id).update({"content": content})
+        db.commit()
+    finally:
+        db.close()
+
+
+async def run_turn(chat_id, mode, chunks, interval, lateness):
+    if mode == "threadpool":
+        assistant_id = await run_db(prepare_turn, SessionLocal(), chat_id)
+    else:
+        assistant_id = prepare_turn(SessionLocal(), chat_id)
+
+    expected = time.perf_counter()
+    for _ in range(chunks):
+        expected += interval
+        await asyncio.sleep(max(0.0, expected - time.perf_counter()))
+        lateness.append((time.perf_counter() - expected) * 1000)
+
+    # A fresh session for the final write, as the message writer uses
+    if mode == "threadpool":
+        await run_db(finish_turn, SessionLocal(), assistant_id, "x" * chunks)
+    else:
+        finish_turn(SessionLocal(), assistant_id, "x" * chunks)
+
+
+async def run_mode(mode, chat_ids, chunks, interval):
+    lateness = []
+    started = time.perf_counter()
+    await asyncio.gather(*(run_turn(chat_id, mode, chunks, interval, lateness) for chat_id in chat_ids))
+    elapsed = time.perf_counter() - started
+    return {
+        "mode": mode,
+        "chats": len(chat_ids),
+        "chunks_per_chat": chunks,
+        "elapsed_s": round(elapsed, 3),
+        "chunk_lateness_ms": {
+            "p50": round(percentile(lateness, 50), 2),
+            "p95": round(percentile(lateness, 95), 2),
+            "p99": round(percentile(lateness, 99), 2),
+            "max": round(max(lateness) if lateness else 0.0, 2),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=200, help="Concurrent chat turns")
+    parser.add_argument("--chunks", type=int, default=50, help="Chunks streamed per turn")
+    parser.add_argument("--interval-ms", type=float, default=20.0, help="Target gap between chunks")
+    parser.add_argument("--mode", choices=["inline", "threadpool", "both"], default="both")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    chat_ids = setup_chats(args.chats)
+    modes = ["inline", "threadpool"] if args.mode == "both" else [args.mode]
+
+    results = [asyncio.run(run_mode(mode, chat_ids, args.chunks, args.interval_ms / 1000)) for mode in modes]
+    shutdown_db_executor()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
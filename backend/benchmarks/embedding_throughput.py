@@ -0,0 +1,70 @@
+"""
+CPU throughput benchmark for the shared embedding engine.
+
+Embeds a synthetic corpus with each combination of batch size and ONNX
+thread count and reports embeddings/sec. Uses the cached all-MiniLM-L6-v2
+model (downloaded by Chroma on first use).
+
+Usage (from backend/):
+    python -m benchmarks.embedding_throughput --texts 2000 --batch-sizes 16,32,64 --threads 0,1,4
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embeddings import EmbeddingEngine  # noqa: E402
+
+WORDS = (
+    "contract clause section payment invoice delivery warranty liability party agreement "
+    "termination notice period schedule annex device firmware voltage sensor manual install "
+    "configure network server request response latency throughput memory storage backup"
+).split()
+
+
+def synthetic_texts(count, words_per_text, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(words_per_text)) for _ in range(count)]
+
+
+def run(texts, batch_size, threads, quantized):
+    engine = EmbeddingEngine(intra_op_threads=threads, batch_size=batch_size, quantized=quantized)
+    engine.warmup()
+    started = time.perf_counter()
+    engine.embed(texts)
+    elapsed = time.perf_counter() - started
+    return {
+        "batch_size": batch_size,
+        "intra_op_threads": threads,
+        "quantized": engine.quantized,
+        "load_seconds": round(engine.load_seconds, 3),
+        "texts": len(texts),
+        "seconds": round(elapsed, 3),
+        "embeddings_per_sec": round(len(texts) / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=120, help="Words per text")
+    parser.add_argument("--batch-sizes", default="16,32,64")
+    parser.add_argument("--threads", default="0", help="Comma-separated intra-op thread counts (0 = default)")
+    parser.add_argument("--quantized", action="store_true", help="Benchmark the int8 model")
+    args = parser.parse_args()
+
+    texts = synthetic_texts(args.texts, args.words)
+    results = [
+        run(texts, int(batch_size), int(threads), args.quantized)
+        for threads in args.threads.split(",")
+        for batch_size in args.batch_sizes.split(",")
+    ]
+    print(json.dumps({"cpu_count": os.cpu_count(), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
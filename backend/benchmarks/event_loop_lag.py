@@ -0,0 +1,112 @@
+"""
+Event-loop lag benchmark for vector store queries.
+
+Fills a temporary Chroma collection with random embeddings, then runs
+concurrent queries either directly on the event loop (the old behaviour) or
+through AsyncVectorStore. A ticker coroutine sleeps 1 ms at a time and records
+how late it wakes up; that lateness is the lag every other request would see.
+No embedding model is needed.
+
+Usage (from backend/):
+    python -m benchmarks.event_loop_lag --chunks 20000 --queries 500 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["CHROMA_PERSIST_DIR"] = tempfile.mkdtemp(prefix="chroma_bench_")
+
+from vector_db import get_chroma_client, get_vector_store, shutdown_vector_store  # noqa: E402
+
+DIMENSIONS = 384
+DOCUMENT_ID = "bench"
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def fill_collection(chunks, rng):
+    collection = get_chroma_client().get_or_create_collection(f"pdf_{DOCUMENT_ID}")
+    for start in range(0, chunks, 5000):
+        count = min(5000, chunks - start)
+        collection.add(
+            ids=[f"c{i}" for i in range(start, start + count)],
+            embeddings=rng.standard_normal((count, DIMENSIONS)).astype(np.float32).tolist(),
+            documents=[f"chunk {i}" for i in range(start, start + count)],
+        )
+    return collection
+
+
+async def ticker(stop, lags, interval=0.001):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - started - interval) * 1000)
+
+
+async def run_mode(mode, collection, queries, concurrency, top_k):
+    store = get_vector_store()
+    semaphore = asyncio.Semaphore(concurrency)
+    lags = []
+    stop = asyncio.Event()
+
+    async def one(embedding):
+        async with semaphore:
+            if mode == "inline":
+                collection.query(query_embeddings=[embedding], n_results=top_k)
+                await asyncio.sleep(0)
+            else:
+                await store.query(collection, embedding, top_k)
+
+    tick = asyncio.create_task(ticker(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(one(embedding) for embedding in queries))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick
+    return {
+        "mode": mode,
+        "queries": len(queries),
+        "queries_per_sec": round(len(queries) / elapsed, 1),
+        "loop_lag_ms": {
+            "p50": round(percentile(lags, 50), 3),
+            "p99": round(percentile(lags, 99), 3),
+            "max": round(max(lags) if lags else 0.0, 3),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    collection = fill_collection(args.chunks, rng)
+    queries = rng.standard_normal((args.queries, DIMENSIONS)).astype(np.float32).tolist()
+
+    results = [
+        asyncio.run(run_mode(mode, collection, queries, args.concurrency, args.top_k))
+        for mode in ("inline", "async_store")
+    ]
+    shutdown_vector_store()
+    print(json.dumps({"chunks": args.chunks, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
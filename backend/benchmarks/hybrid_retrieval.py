@@ -0,0 +1,141 @@
+"""
+Recall and latency benchmark for vector vs hybrid (vector + BM25) retrieval.
+
+Builds a synthetic corpus of manual-like chunks, each mentioning a unique part
+number, firmware version or clause number, and asks one question per chunk that
+quotes that identifier. Dense rankings come from the embedding engine (exact
+cosine search, the upper bound of what HNSW returns); lexical rankings come from
+lexical_index; hybrid fuses both with reciprocal-rank fusion. Reports recall@k
+and per-query latency percentiles for each mode.
+
+Usage (from backend/):
+    python -m benchmarks.hybrid_retrieval --chunks 2000 --queries 200 --top-k 5
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lexical_index  # noqa: E402
+from embeddings import get_embedding_engine  # noqa: E402
+
+TOPICS = [
+    "Replace the hydraulic filter and check the pump pressure after {hours} operating hours.",
+    "The supplier shall deliver the goods within {days} days of receiving the purchase order.",
+    "Tighten the mounting bolts to the specified torque before powering on the unit.",
+    "Payment is due within {days} days of the invoice date unless agreed otherwise.",
+    "Update the controller firmware before connecting the sensor array to the network.",
+    "Inspect the drive belt for wear and replace it if cracks are visible.",
+]
+
+
+def identifier(rng, i):
+    kind = i % 3
+    if kind == 0:
+        return f"{rng.choice(['ABX', 'QR', 'ZT', 'MKV'])}-{1000 + i}"
+    if kind == 1:
+        return f"v{i // 100}.{i % 100}.{rng.randint(0, 9)}"
+    return f"clause {i // 50 + 1}.{i % 50 + 1}({rng.choice('abcd')})"
+
+
+def synthetic_corpus(count, seed=0):
+    rng = random.Random(seed)
+    chunks, identifiers = [], []
+    for i in range(count):
+        ident = identifier(rng, i)
+        sentences = [rng.choice(TOPICS).format(hours=rng.randint(100, 900), days=rng.randint(10, 90)) for _ in range(4)]
+        sentences.insert(rng.randint(0, 4), f"This applies to {ident} only.")
+        chunks.append(" ".join(sentences))
+        identifiers.append(ident)
+    return chunks, identifiers
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(mode, hits, latencies, top_k):
+    return {
+        "mode": mode,
+        f"recall@{top_k}": round(sum(hits) / len(hits), 3),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=20)
+    args = parser.parse_args()
+
+    chunks, identifiers = synthetic_corpus(args.chunks)
+    ids = [f"bench_{i}" for i in range(len(chunks))]
+    rng = random.Random(1)
+    targets = rng.sample(range(len(chunks)), min(args.queries, len(chunks)))
+    queries = [f"What does the manual say about {identifiers[i]}?" for i in targets]
+
+    engine = get_embedding_engine()
+    started = time.perf_counter()
+    matrix = engine.embed(chunks)
+    embed_seconds = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory(prefix="lexical_bench_") as directory:
+        lexical_index.LEXICAL_INDEX_DIR = directory
+        started = time.perf_counter()
+        lexical_index.build_index("bench", ids, chunks)
+        build_seconds = time.perf_counter() - started
+
+        hits = {"vector": [], "lexical": [], "hybrid": []}
+        latencies = {"vector": [], "lexical": [], "hybrid": []}
+        for target, query in zip(targets, queries):
+            expected = ids[target]
+
+            started = time.perf_counter()
+            query_embedding = engine.embed([query])[0]
+            scores = matrix @ query_embedding
+            dense = [ids[i] for i in np.argsort(-scores)[:args.candidates]]
+            dense_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            lexical = [chunk_id for chunk_id, _ in lexical_index.search("bench", query, args.candidates)]
+            lexical_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            fused = [chunk_id for chunk_id, _ in lexical_index.reciprocal_rank_fusion([dense, lexical])]
+            fuse_seconds = time.perf_counter() - started
+
+            for mode, ranking, seconds in (
+                ("vector", dense, dense_seconds),
+                ("lexical", lexical, lexical_seconds),
+                # Both retrievers run concurrently in query_chroma
+                ("hybrid", fused, max(dense_seconds, lexical_seconds) + fuse_seconds),
+            ):
+                hits[mode].append(expected in ranking[:args.top_k])
+                latencies[mode].append(seconds)
+
+        index_bytes = sum(os.path.getsize(os.path.join(directory, "bench", name)) for name in os.listdir(os.path.join(directory, "bench")))
+
+    print(json.dumps({
+        "chunks": len(chunks),
+        "queries": len(queries),
+        "embed_corpus_seconds": round(embed_seconds, 2),
+        "lexical_build_seconds": round(build_seconds, 3),
+        "lexical_index_mb": round(index_bytes / (1024 * 1024), 2),
+        "results": [summarize(mode, hits[mode], latencies[mode], args.top_k) for mode in hits],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
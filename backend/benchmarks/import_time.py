@@ -0,0 +1,156 @@
+"""
+Cold-start profile of the API.
+
+Imports `main` in fresh interpreters with `python -X importtime` and reports
+the total import time, the slowest modules imported by main, and which heavy
+subsystems (chromadb, onnxruntime, PyPDF2, langdetect, tokenizers) were loaded
+eagerly. For comparison it also imports `main` together with those subsystems,
+which is what startup cost before they were made lazy.
+
+With --startup it also starts uvicorn against a throwaway database and vector
+store and measures how long until /healthz answers (the server listens) and
+until /readyz reports ready (vector store and embedding model warmed up).
+
+Usage (from backend/):
+    python -m benchmarks.import_time --repeats 5 --startup
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["chromadb", "onnxruntime", "PyPDF2", "langdetect", "tokenizers"]
+
+
+def profile_import(modules, env):
+    """
+    Import `modules` under -X importtime. Returns the total seconds, the cumulative seconds of each
+    module imported directly by them, and which heavy modules ended up loaded.
+    """
+    statement = "; ".join(f"import {m}" for m in modules)
+    check = f"import sys; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"{statement}; {check}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    total = 0.0
+    breakdown = {}
+    children = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        name, seconds = name.strip(), int(cumulative) / 1_000_000
+        # Children are listed before the module that imported them
+        if depth == 1:
+            children[name] = seconds
+        elif depth == 0:
+            if name in modules:
+                total += seconds
+                if name == "main":
+                    breakdown.update(children)
+                else:
+                    breakdown[name] = seconds
+            children = {}
+    output = result.stdout.strip().splitlines()
+    loaded = [m for m in output[-1].split(",") if m] if output else []
+    return total, breakdown, loaded
+
+
+def measure_imports(modules, repeats, env, top):
+    totals = []
+    breakdowns = {}
+    loaded = []
+    for _ in range(repeats):
+        total, breakdown, loaded = profile_import(modules, env)
+        totals.append(total)
+        for name, seconds in breakdown.items():
+            breakdowns.setdefault(name, []).append(seconds)
+    slowest = sorted(((statistics.median(v), k) for k, v in breakdowns.items()), reverse=True)[:top]
+    return {
+        "median_ms": round(statistics.median(totals) * 1000, 1),
+        "min_ms": round(min(totals) * 1000, 1),
+        "slowest_imports_ms": {name: round(seconds * 1000, 1) for seconds, name in slowest},
+        "heavy_modules_loaded": loaded,
+    }
+
+
+def wait_for(url, timeout, status=200):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code == status:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.05)
+    return False
+
+
+def measure_startup(port, timeout, env):
+    with tempfile.TemporaryDirectory(prefix="import_bench_") as directory:
+        env = dict(
+            env,
+            DATABASE_URL=f"sqlite:///{os.path.join(directory, 'startup.db')}",
+            CHROMA_PERSIST_DIR=os.path.join(directory, "chroma_db"),
+            PYTHONPATH=BACKEND_DIR,
+        )
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=directory, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            live = wait_for(f"http://127.0.0.1:{port}/healthz", timeout)
+            live_seconds = time.perf_counter() - started
+            ready = live and wait_for(f"http://127.0.0.1:{port}/readyz", timeout)
+            ready_seconds = time.perf_counter() - started
+            report = None
+            if live:
+                report = httpx.get(f"http://127.0.0.1:{port}/readyz", timeout=5).json()
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+    return {
+        "live_after_s": round(live_seconds, 2) if live else None,
+        "ready_after_s": round(ready_seconds, 2) if ready else None,
+        "readiness": report,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--startup", action="store_true", help="also time uvicorn until /healthz and /readyz answer")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="import_bench_") as directory:
+        # Importing main must not touch the real database or vector store
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{os.path.join(directory, 'import.db')}",
+            CHROMA_PERSIST_DIR=os.path.join(directory, "chroma_db"),
+        )
+        results = {
+            "import_main": measure_imports(["main"], args.repeats, env, args.top),
+            "import_main_eager": measure_imports(["main"] + HEAVY_MODULES, args.repeats, env, args.top),
+        }
+    if args.startup:
+        results["startup"] = measure_startup(args.port, args.timeout, dict(os.environ))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""
+Micro-benchmark suite for the document path, with regression baselines.
+
+Everything runs on generated data, against a throwaway Chroma directory:
+- extract: PyPDF2 page extraction (pdf_extract, as used by ingestion) on a
+  generated multi-page PDF, single process, so the figure is per core
+- split:   vector_db.split_text throughput on the extracted text
+- add:     vector_db.add_document_to_chroma, i.e. embedding plus insert
+- query:   vector_db.query_chroma latency with collections of 10, 1k and 100k
+           chunks, in vector and hybrid mode
+
+--embeddings model uses the cached all-MiniLM-L6-v2 engine (as in production);
+--embeddings hash swaps in a cheap deterministic hash embedding to isolate
+Chroma's own cost. Query collections are always populated with hash embeddings,
+so building the 100k collection does not take minutes of inference; the query
+itself is embedded with the selected engine.
+
+Save a run with --save-baseline, and compare a later run with --baseline; the
+comparison flags metrics that got worse by more than --tolerance and the process
+exits with status 1 if any did.
+
+Usage (from backend/):
+    python -m benchmarks.ingestion_suite --save-baseline baseline.json
+    python -m benchmarks.ingestion_suite --baseline baseline.json --tolerance 0.15
+    python -m benchmarks.ingestion_suite --embeddings hash --query-sizes 10,1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Point the vector store and lexical indexes at a throwaway directory before importing them
+_tmpdir = tempfile.mkdtemp(prefix="ingestion_bench_")
+os.environ["CHROMA_PERSIST_DIR"] = os.path.join(_tmpdir, "chroma_db")
+os.environ["LEXICAL_INDEX_DIR"] = os.path.join(_tmpdir, "lexical_index")
+
+import embedding_batcher  # noqa: E402
+from embeddings import get_embedding_engine  # noqa: E402
+import vector_db  # noqa: E402
+from lexical_index import build_index  # noqa: E402
+from pdf_extract import count_pages, extract_pages  # noqa: E402
+
+WORDS = (
+    "the supplier shall deliver goods within thirty days of the purchase order section clause "
+    "payment terms invoice warranty part number ABX-1042 firmware v2.3.1 voltage torque "
+    "maintenance schedule replace filter every months inspection safety notice device sensor "
+    "calibration pressure valve pump motor bearing lubrication tolerance assembly"
+).split()
+
+POPULATE_BATCH = 5000
+
+
+def sentence(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + "."
+
+
+def make_pdf(path, pages, lines_per_page, seed=0):
+    """
+    Write a plain-text PDF with Helvetica text lines, without any PDF library.
+    """
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for _ in range(pages):
+        lines = " T* ".join(f"({sentence(rng)[:95]}) Tj" for _ in range(lines_per_page))
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {lines} ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+            % len(objects)
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(f"{k} 0 R" for k in kids).encode(), pages)
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+class HashEmbeddingEngine:
+    """
+    Deterministic bag-of-words hash embedding with the model's shape (384 floats, L2-normalized).
+    """
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), 384), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, zlib.crc32(word.encode()) % 384] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.clip(norms, 1e-12, None)
+
+
+def use_hash_embeddings():
+    embedding_batcher._batcher = embedding_batcher.EmbeddingBatcher(HashEmbeddingEngine())
+
+
+def bench_extract(directory, pages, lines_per_page, repeats):
+    path = os.path.join(directory, "synthetic.pdf")
+    make_pdf(path, pages, lines_per_page)
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        page_count = count_pages(path)
+        extracted = extract_pages(path, 0, page_count)
+        timings.append(time.perf_counter() - started)
+    elapsed = statistics.median(timings)
+    text = "\n".join(page_text for _, page_text in extracted)
+    return text, {
+        "pages": page_count,
+        "file_mb": round(os.path.getsize(path) / (1024 * 1024), 2),
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(page_count / elapsed, 1),
+    }
+
+
+def bench_split(text, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        chunks = vector_db.split_text(text)
+        timings.append(time.perf_counter() - started)
+    elapsed = statistics.median(timings)
+    return chunks, {
+        "text_mb": round(len(text) / (1024 * 1024), 2),
+        "chunks": len(chunks),
+        "seconds": round(elapsed, 3),
+        "mb_per_sec": round(len(text) / (1024 * 1024) / elapsed, 2),
+        "chunks_per_sec": round(len(chunks) / elapsed, 1),
+    }
+
+
+async def bench_add(text, chunk_count):
+    started = time.perf_counter()
+    await vector_db.add_document_to_chroma("bench_add", text, {"source": "benchmark"})
+    elapsed = time.perf_counter() - started
+    return {"chunks": chunk_count, "seconds": round(elapsed, 3), "chunks_per_sec": round(chunk_count / elapsed, 1)}
+
+
+async def populate(document_id, size, seed):
+    rng = random.Random(seed)
+    engine = HashEmbeddingEngine()
+    store = vector_db.get_vector_store()
+    all_ids, all_chunks = [], []
+    for start in range(0, size, POPULATE_BATCH):
+        chunks = [" ".join(sentence(rng) for _ in range(6)) for _ in range(min(POPULATE_BATCH, size - start))]
+        ids = [f"{document_id}_{start + i}" for i in range(len(chunks))]
+        await store.add(document_id, ids, chunks, engine.embed(chunks).tolist(), [{"page": 0}] * len(chunks))
+        all_ids.extend(ids)
+        all_chunks.extend(chunks)
+    build_index(document_id, all_ids, all_chunks)
+
+
+async def bench_query(size, queries, seed):
+    document_id = f"bench_query_{size}"
+    started = time.perf_counter()
+    await populate(document_id, size, seed)
+    populate_seconds = time.perf_counter() - started
+
+    rng = random.Random(seed + 1)
+    result = {"chunks": size, "populate_seconds": round(populate_seconds, 2)}
+    for mode in vector_db.RETRIEVAL_MODES:
+        latencies = []
+        for i in range(queries):
+            # Distinct queries, so the query embedding cache never hits
+            query = f"{sentence(rng)} {mode} {i}"
+            started = time.perf_counter()
+            documents = await vector_db.query_chroma(document_id, query, top_k=3, mode=mode)
+            latencies.append(time.perf_counter() - started)
+            if not documents:
+                # query_chroma logs and swallows errors; an empty answer would look fast
+                raise RuntimeError(f"{mode} query on {size} chunks returned nothing")
+        latencies.sort()
+        result[mode] = {
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+            "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2),
+        }
+    return result
+
+
+def flatten(results, prefix=""):
+    """
+    Flatten nested results into {"stage.metric": value} for comparison.
+    """
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(current, baseline, tolerance):
+    """
+    Compare rate (*_per_sec, higher is better) and latency (*_ms, lower is better) metrics.
+    """
+    current_flat, baseline_flat = flatten(current), flatten(baseline)
+    comparison = {}
+    for name, value in current_flat.items():
+        base = baseline_flat.get(name)
+        if not base or not (name.endswith("_per_sec") or name.endswith("_ms")):
+            continue
+        change = (value - base) / base
+        worse = -change if name.endswith("_per_sec") else change
+        comparison[name] = {
+            "baseline": base,
+            "current": value,
+            "change_pct": round(change * 100, 1),
+            "regression": worse > tolerance,
+        }
+    return comparison
+
+
+async def run(args):
+    if args.embeddings == "hash":
+        use_hash_embeddings()
+    else:
+        get_embedding_engine().warmup()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="ingestion_pdf_") as directory:
+        text, results["extract"] = bench_extract(directory, args.pages, args.lines_per_page, args.repeats)
+    chunks, results["split"] = bench_split(text, args.repeats)
+    results["add"] = await bench_add(text, len(chunks))
+    results["query"] = {}
+    for size in args.query_sizes.split(","):
+        results["query"][size] = await bench_query(int(size), args.queries, seed=int(size))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--lines-per-page", type=int, default=60)
+    parser.add_argument("--repeats", type=int, default=3, help="extraction and split_text runs; the median is reported")
+    parser.add_argument("--query-sizes", default="10,1000,100000", help="chunks per queried collection")
+    parser.add_argument("--queries", type=int, default=50, help="queries per collection and mode")
+    parser.add_argument("--embeddings", choices=["model", "hash"], default="model")
+    parser.add_argument("--save-baseline", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare the results with this file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        vector_db.shutdown_vector_store()
+        embedding_batcher.shutdown_embedding_batcher()
+        shutil.rmtree(_tmpdir, ignore_errors=True)
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "embeddings": args.embeddings,
+        },
+        "results": results,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("environment") != report["environment"]:
+            report["baseline_environment"] = baseline.get("environment")
+        report["comparison"] = compare(results, baseline["results"], args.tolerance)
+        regressions = [name for name, entry in report["comparison"].items() if entry["regression"]]
+        report["regressions"] = regressions
+
+    print(json.dumps(report, indent=2))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
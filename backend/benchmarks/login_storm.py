@@ -0,0 +1,121 @@
+"""
+Login-storm benchmark: stream latency while many users log in at once.
+
+Opens N simulated SSE streams that each emit a chunk every 10 ms and records how
+late every chunk is. Meanwhile M logins verify bcrypt passwords, either inline on
+the event loop (the old login path) or in auth's password worker pool. A second
+phase measures per-request token resolution against a temporary SQLite database,
+with and without the verified-token cache.
+
+Usage (from backend/):
+    python -m benchmarks.login_storm --streams 200 --logins 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Point the app at a throwaway database before importing it
+_tmpdir = tempfile.mkdtemp(prefix="login_bench_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}"
+
+import auth  # noqa: E402
+import models  # noqa: E402
+from database import SessionLocal, engine, Base, shutdown_db_executor  # noqa: E402
+
+CHUNK_INTERVAL = 0.01
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def stream(lateness, stop):
+    scheduled = time.perf_counter()
+    while not stop.is_set():
+        scheduled += CHUNK_INTERVAL
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        lateness.append(time.perf_counter() - scheduled)
+
+
+async def login(mode, password, hashed):
+    if mode == "inline":
+        return auth.verify_password(password, hashed)
+    return await auth.verify_password_async(password, hashed)
+
+
+async def run_storm(mode, streams, logins, hashed):
+    lateness = []
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(stream(lateness, stop)) for _ in range(streams)]
+    await asyncio.sleep(0.2)
+    lateness.clear()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login(mode, "correct horse", hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await asyncio.gather(*tasks)
+    return {
+        "mode": mode,
+        "streams": streams,
+        "logins": logins,
+        "logins_seconds": round(elapsed, 2),
+        "chunk_lateness_p50_ms": round(percentile(lateness, 50) * 1000, 1),
+        "chunk_lateness_p99_ms": round(percentile(lateness, 99) * 1000, 1),
+        "chunk_lateness_max_ms": round(max(lateness, default=0.0) * 1000, 1),
+    }
+
+
+async def run_resolve(requests, cached):
+    db = SessionLocal()
+    try:
+        token = auth.create_access_token({"sub": "bench@example.com"})
+        auth._token_cache = auth.TokenCache(ttl=auth.AUTH_CACHE_TTL if cached else 0.000001)
+        started = time.perf_counter()
+        for _ in range(requests):
+            await auth.resolve_token(token, db)
+        elapsed = time.perf_counter() - started
+        return {
+            "token_cache": cached,
+            "requests": requests,
+            "per_request_us": round(elapsed / requests * 1_000_000, 1),
+        }
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--resolve-requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    hashed = auth.get_password_hash("correct horse")
+    db = SessionLocal()
+    db.add(models.User(username="bench", email="bench@example.com", hashed_password=hashed))
+    db.commit()
+    db.close()
+
+    results = {
+        "login_storm": [asyncio.run(run_storm(mode, args.streams, args.logins, hashed)) for mode in ("inline", "pooled")],
+        "token_resolution": [asyncio.run(run_resolve(args.resolve_requests, cached)) for cached in (False, True)],
+    }
+    auth.shutdown_password_executor()
+    shutdown_db_executor()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
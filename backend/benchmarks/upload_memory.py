@@ -0,0 +1,211 @@
+"""
+End-to-end memory benchmark for concurrent large PDF uploads.
+
+Starts the API with uvicorn against a throwaway database, vector store and
+temporary directory, then sends N concurrent multipart uploads to /pdfs/upload
+over HTTP, streamed from a generator so the client holds one block at a time:
+- accepted:   valid PDFs just under the limit
+- oversized:  PDFs of several times the limit, sent chunked (no Content-Length)
+- declared:   the same, but declaring their size in Content-Length
+- not_pdf:    large bodies whose file part does not start with %PDF-
+
+For each case it reports the status codes, the time until the server answered,
+the server's peak resident memory above its idle level, and the peak size of
+Starlette's multipart spool (the temporary files the body is written to before
+the route runs), sampled from the server's open file descriptors. Linux only.
+
+Usage (from backend/):
+    python -m benchmarks.upload_memory --size-mb 200 --concurrency 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BOUNDARY = "upload-bench-boundary"
+BLOCK = os.urandom(1024 * 1024)
+
+
+class ServerSampler(threading.Thread):
+    """
+    Samples the server's resident memory and the size of its spooled temporary files.
+    """
+
+    def __init__(self, pid, spool_dir, interval=0.02):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.spool_dir = spool_dir
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_spool = 0
+        self.running = True
+
+    def rss(self):
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    def spool(self):
+        total = 0
+        fd_dir = f"/proc/{self.pid}/fd"
+        for fd in os.listdir(fd_dir):
+            try:
+                if os.readlink(os.path.join(fd_dir, fd)).startswith(self.spool_dir):
+                    total += os.stat(os.path.join(fd_dir, fd)).st_size
+            except OSError:
+                pass
+        return total
+
+    def reset(self):
+        self.peak_rss = self.rss()
+        self.peak_spool = 0
+
+    def run(self):
+        while self.running:
+            try:
+                self.peak_rss = max(self.peak_rss, self.rss())
+                self.peak_spool = max(self.peak_spool, self.spool())
+            except OSError:
+                return
+            time.sleep(self.interval)
+
+
+def multipart_body(first_bytes, size_mb):
+    yield (
+        f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"bench.pdf\"\r\n"
+        f"Content-Type: application/pdf\r\n\r\n"
+    ).encode()
+    yield first_bytes
+    for _ in range(size_mb):
+        yield BLOCK
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def body_length(first_bytes, size_mb):
+    return sum(len(part) for part in multipart_body(first_bytes, 0)) + size_mb * len(BLOCK)
+
+
+async def upload(client, token, size_mb, pdf=True, declare_length=False):
+    # A unique first line keeps identical uploads from being deduplicated by content hash
+    first_bytes = f"%PDF-1.4 {uuid.uuid4()}\n".encode() if pdf else f"plain text {uuid.uuid4()}\n".encode() * 100
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+    if declare_length:
+        headers["Content-Length"] = str(body_length(first_bytes, size_mb))
+
+    async def content():
+        for part in multipart_body(first_bytes, size_mb):
+            yield part
+
+    started = time.perf_counter()
+    try:
+        response = await client.post("/pdfs/upload", content=content(), headers=headers)
+        status = response.status_code
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    return status, time.perf_counter() - started
+
+
+async def run_case(name, base_url, token, sampler, concurrency, size_mb, **kwargs):
+    sampler.reset()
+    idle_rss = sampler.peak_rss
+    async with httpx.AsyncClient(base_url=base_url, timeout=300) as client:
+        results = await asyncio.gather(*(upload(client, token, size_mb, **kwargs) for _ in range(concurrency)))
+    await asyncio.sleep(0.2)
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "case": name,
+        "concurrency": concurrency,
+        "body_mb": size_mb,
+        "statuses": statuses,
+        "max_seconds": round(max(seconds for _, seconds in results), 3),
+        "server_peak_rss_delta_mb": round((sampler.peak_rss - idle_rss) / (1024 * 1024), 1),
+        "server_peak_spool_mb": round(sampler.peak_spool / (1024 * 1024), 1),
+    }
+
+
+def wait_until_up(url, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+async def run_cases(args, base_url, sampler):
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        username = f"upload-bench-{uuid.uuid4().hex[:8]}"
+        response = await client.post("/auth/register", json={
+            "username": username, "email": f"{username}@example.com", "password": "upload-bench-password"
+        })
+        response.raise_for_status()
+        token = response.json()["access_token"]
+
+    accepted_mb = max(1, args.limit_mb - 1)
+    oversized_mb = args.limit_mb * args.oversize_factor
+    cases = [
+        ("accepted", accepted_mb, {}),
+        ("oversized", oversized_mb, {}),
+        ("declared", oversized_mb, {"declare_length": True}),
+        ("not_pdf", oversized_mb, {"pdf": False}),
+    ]
+    return [
+        await run_case(name, base_url, token, sampler, args.concurrency, size_mb, **kwargs)
+        for name, size_mb, kwargs in cases
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", dest="limit_mb", type=int, default=200, help="upload limit (MAX_UPLOAD_BYTES) of the server")
+    parser.add_argument("--oversize-factor", type=int, default=4, help="size of rejected bodies, as a multiple of the limit")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="upload_bench_") as workdir:
+        spool_dir = os.path.join(workdir, "tmp")
+        os.makedirs(spool_dir)
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'upload.db')}",
+            CHROMA_PERSIST_DIR=os.path.join(workdir, "chroma_db"),
+            MAX_UPLOAD_BYTES=str(args.limit_mb * 1024 * 1024),
+            TMPDIR=spool_dir,
+            PYTHONPATH=BACKEND_DIR,
+        )
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "error"],
+            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        sampler = ServerSampler(process.pid, spool_dir)
+        try:
+            base_url = f"http://127.0.0.1:{args.port}"
+            wait_until_up(f"{base_url}/healthz")
+            sampler.start()
+            results = asyncio.run(run_cases(args, base_url, sampler))
+        finally:
+            sampler.running = False
+            process.terminate()
+            process.wait(timeout=30)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import base64
+import binascii
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+import models
+
+# Default and largest page sizes for chat and message listings
+PAGE_DEFAULT_LIMIT = int(os.getenv("PAGE_DEFAULT_LIMIT", "50"))
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "200"))
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(updated_at: datetime, chat_id: int) -> str:
+    """
+    Opaque cursor pointing just after a chat in (updated_at DESC, id DESC) order.
+    """
+    raw = f"{updated_at.isoformat()}|{chat_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        updated_at, chat_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(updated_at), int(chat_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def list_chat_summaries(
+    db: Session,
+    user_id: int,
+    limit: int = PAGE_DEFAULT_LIMIT,
+    cursor: Optional[str] = None
+) -> Tuple[List[models.Chat], Optional[str]]:
+    """
+    One page of a user's chats, most recently updated first, without their messages.
+    Uses keyset pagination, so every page costs one index range scan regardless of depth.
+    """
+    query = db.query(models.Chat).filter(models.Chat.user_id == user_id)
+    if cursor:
+        updated_at, chat_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            models.Chat.updated_at < updated_at,
+            and_(models.Chat.updated_at == updated_at, models.Chat.id < chat_id)
+        ))
+
+    chats = query.order_by(models.Chat.updated_at.desc(), models.Chat.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(chats) > limit:
+        chats = chats[:limit]
+        next_cursor = encode_cursor(chats[-1].updated_at, chats[-1].id)
+    return chats, next_cursor
+
+
+def list_messages(
+    db: Session,
+    chat_id: int,
+    before_id: Optional[int] = None,
+    limit: int = PAGE_DEFAULT_LIMIT
+) -> Tuple[List[models.Message], Optional[int]]:
+    """
+    The `limit` messages of a chat preceding `before_id` (or the latest ones), oldest first.
+    Returns the page and the before_id of the next older page, or None at the start of the chat.
+    """
+    query = db.query(models.Message).filter(models.Message.chat_id == chat_id)
+    if before_id is not None:
+        query = query.filter(models.Message.id < before_id)
+
+    messages = query.order_by(models.Message.id.desc()).limit(limit + 1).all()
+    next_before_id = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        next_before_id = messages[-1].id
+    messages.reverse()
+    return messages, next_before_id
@@ -0,0 +1,184 @@
+import os
+import re
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from embeddings import EMBEDDING_MAX_LENGTH
+from tokens import CHROMA_TOKENIZER_PATH, get_tokenizer
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# The embedding model adds [CLS] and [SEP] to every chunk; chunks are counted without them
+EMBEDDING_SPECIAL_TOKENS = 2
+# Chunk sizes in tokens of the embedding model; anything past its max length would be truncated
+CHUNK_TOKEN_LIMIT = EMBEDDING_MAX_LENGTH - EMBEDDING_SPECIAL_TOKENS
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", str(CHUNK_TOKEN_LIMIT)))
+if CHUNK_MAX_TOKENS > CHUNK_TOKEN_LIMIT:
+    logger.warning(f"CHUNK_MAX_TOKENS={CHUNK_MAX_TOKENS} exceeds what the embedding model keeps; using {CHUNK_TOKEN_LIMIT}")
+    CHUNK_MAX_TOKENS = CHUNK_TOKEN_LIMIT
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+# Text is tokenized in pieces of roughly this many characters, in parallel
+SEGMENT_CHARS = 100_000
+
+# Preferred split points, strongest first: paragraph, line, sentence, word
+BOUNDARY_PATTERNS = [
+    re.compile(r"\n\s*\n"),
+    re.compile(r"\n"),
+    re.compile(r"(?<=[.!?;:])\s+"),
+    re.compile(r"\s+"),
+]
+
+# Used when no tokenizer is available: words and punctuation approximate tokens
+FALLBACK_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+_tokenizer = None
+_tokenizer_loaded = False
+_tokenizer_from_model = False
+_tokenizer_lock = threading.Lock()
+
+
+def get_chunk_tokenizer():
+    """
+    Tokenizer of the embedding model, so chunk sizes match what the model actually sees.
+    Falls back to the shared budgeting tokenizer, then to None.
+    """
+    global _tokenizer, _tokenizer_loaded, _tokenizer_from_model
+    if not _tokenizer_loaded:
+        with _tokenizer_lock:
+            if not _tokenizer_loaded:
+                if CHROMA_TOKENIZER_PATH.exists():
+                    from tokenizers import Tokenizer
+                    _tokenizer = Tokenizer.from_file(str(CHROMA_TOKENIZER_PATH))
+                    _tokenizer.no_truncation()
+                    _tokenizer.no_padding()
+                    _tokenizer_from_model = True
+                else:
+                    _tokenizer = get_tokenizer()
+                _tokenizer_loaded = True
+    return _tokenizer
+
+
+def refresh_chunk_tokenizer():
+    """
+    Switch to the embedding model's tokenizer if earlier calls ran before it was downloaded.
+    """
+    global _tokenizer_loaded
+    with _tokenizer_lock:
+        if not _tokenizer_from_model:
+            _tokenizer_loaded = False
+    return get_chunk_tokenizer()
+
+
+def _segments(text: str) -> List[Tuple[int, str]]:
+    """
+    Cut text into (offset, piece) segments of about SEGMENT_CHARS, ending at line breaks where possible.
+    """
+    segments = []
+    position = 0
+    while position < len(text):
+        end = min(position + SEGMENT_CHARS, len(text))
+        if end < len(text):
+            newline = text.rfind("\n", position, end)
+            if newline > position:
+                end = newline + 1
+        segments.append((position, text[position:end]))
+        position = end
+    return segments
+
+
+def token_spans(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the start and end character offsets of every token in the text.
+    """
+    tokenizer = get_chunk_tokenizer()
+    if tokenizer is None:
+        spans = [match.span() for match in FALLBACK_TOKEN_PATTERN.finditer(text)]
+        if not spans:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        offsets = np.array(spans, dtype=np.int64)
+        return offsets[:, 0], offsets[:, 1]
+
+    segments = _segments(text)
+    encodings = tokenizer.encode_batch([piece for _, piece in segments], add_special_tokens=False)
+    arrays = [
+        np.array(encoding.offsets, dtype=np.int64).reshape(-1, 2) + base
+        for (base, _), encoding in zip(segments, encodings)
+    ]
+    offsets = np.concatenate(arrays) if arrays else np.zeros((0, 2), dtype=np.int64)
+    return offsets[:, 0], offsets[:, 1]
+
+
+class TextChunker:
+    """
+    Splits text into chunks of at most `max_tokens` real tokens, preferring paragraph,
+    line, sentence and word boundaries, with `overlap_tokens` shared between neighbours.
+    Runs in linear time: the text is tokenized once and boundaries are located with binary search.
+    """
+
+    def __init__(self, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS):
+        if max_tokens <= 0:
+            raise ValueError("max_tokens must be positive")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = max(0, min(overlap_tokens, max_tokens // 2))
+
+    def _boundary_tokens(self, text: str, starts: np.ndarray) -> List[np.ndarray]:
+        # Map each boundary's character position to the index of the first token after it
+        levels = []
+        for pattern in BOUNDARY_PATTERNS:
+            positions = np.fromiter((match.end() for match in pattern.finditer(text)), dtype=np.int64)
+            levels.append(np.unique(np.searchsorted(starts, positions, side="left")))
+        return levels
+
+    def split(self, text: str) -> List[str]:
+        starts, ends = token_spans(text)
+        count = len(starts)
+        if count == 0:
+            return []
+        if count <= self.max_tokens:
+            return [text.strip()]
+
+        levels = self._boundary_tokens(text, starts)
+        chunks = []
+        first = 0
+        while first < count:
+            limit = first + self.max_tokens
+            if limit >= count:
+                last = count
+            else:
+                last = None
+                # Do not accept a boundary that would leave a chunk less than half full
+                floor = first + self.max_tokens // 2
+                for boundaries in levels:
+                    index = np.searchsorted(boundaries, limit, side="right") - 1
+                    if index >= 0 and boundaries[index] > floor:
+                        last = int(boundaries[index])
+                        break
+                if last is None:
+                    last = limit
+
+            chunk = text[starts[first]:ends[last - 1]].strip()
+            if chunk:
+                chunks.append(chunk)
+            if last >= count:
+                break
+            first = max(last - self.overlap_tokens, first + 1)
+
+        return chunks
+
+
+_chunker: Optional[TextChunker] = None
+
+
+def get_chunker() -> TextChunker:
+    """
+    Get the shared chunker configured from the environment.
+    """
+    global _chunker
+    if _chunker is None:
+        _chunker = TextChunker()
+    return _chunker
@@ -0,0 +1,204 @@
+import os
+import logging
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import List, Dict, Any, Deque
+
+from sqlalchemy.orm import Session
+
+import models
+from tokens import count_tokens
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Token budget for the verbatim history window sent to the model
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "3000"))
+# Token budget for the rolling summary of turns evicted from the window
+CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "400"))
+# Maximum number of message rows fetched from the database per turn
+CONTEXT_FETCH_ROWS = int(os.getenv("CONTEXT_FETCH_ROWS", "20"))
+# Number of chats whose context is kept in memory
+CONTEXT_CACHE_CHATS = int(os.getenv("CONTEXT_CACHE_CHATS", "1000"))
+
+# Characters of each evicted turn kept in the summary
+SUMMARY_TURN_CHARS = 200
+
+
+@dataclass
+class Turn:
+    id: int
+    role: str
+    content: str
+    tokens: int
+
+
+def _condense(role: str, content: str) -> str:
+    """
+    Reduce an evicted turn to a single short line for the rolling summary.
+    """
+    text = " ".join(content.split())
+    if len(text) > SUMMARY_TURN_CHARS:
+        cut = text[:SUMMARY_TURN_CHARS]
+        sentence_end = max(cut.rfind(". "), cut.rfind("? "), cut.rfind("! "))
+        text = cut[:sentence_end + 1] if sentence_end > SUMMARY_TURN_CHARS // 2 else cut.rstrip() + "..."
+    return f"{role}: {text}"
+
+
+class ChatContext:
+    """
+    Token-counted sliding window over one chat, plus a summary of evicted turns.
+    """
+
+    def __init__(self):
+        self.turns: Deque[Turn] = deque()
+        self.tokens = 0
+        self.last_id = 0
+        self.summary_lines: Deque[tuple] = deque()
+        self.summary_tokens = 0
+        self.summary = ""
+
+    def append(self, turn: Turn) -> None:
+        self.turns.append(turn)
+        self.tokens += turn.tokens
+        self.last_id = max(self.last_id, turn.id)
+
+    def slide(self, max_tokens: int, summary_max_tokens: int) -> bool:
+        """
+        Evict the oldest turns until the window fits the budget. Returns True if the window moved.
+        """
+        moved = False
+        # Always keep the latest turn, even if it alone exceeds the budget
+        while self.tokens > max_tokens and len(self.turns) > 1:
+            turn = self.turns.popleft()
+            self.tokens -= turn.tokens
+            line = _condense(turn.role, turn.content)
+            line_tokens = count_tokens(line)
+            self.summary_lines.append((line, line_tokens))
+            self.summary_tokens += line_tokens
+            moved = True
+
+        if moved:
+            # Drop the oldest summary lines once the summary exceeds its own budget
+            while self.summary_tokens > summary_max_tokens and len(self.summary_lines) > 1:
+                _, line_tokens = self.summary_lines.popleft()
+                self.summary_tokens -= line_tokens
+            self.summary = "\n".join(line for line, _ in self.summary_lines)
+        return moved
+
+    def messages(self) -> List[Dict[str, str]]:
+        history = []
+        if self.summary:
+            history.append({
+                "role": "system",
+                "content": f"Summary of earlier conversation:\n{self.summary}"
+            })
+        history.extend({"role": turn.role, "content": turn.content} for turn in self.turns)
+        return history
+
+
+class ConversationContextManager:
+    """
+    Keeps a per-chat context window in memory and tops it up with only the rows
+    added since the previous turn.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = CONTEXT_MAX_TOKENS,
+        summary_max_tokens: int = CONTEXT_SUMMARY_MAX_TOKENS,
+        fetch_rows: int = CONTEXT_FETCH_ROWS,
+        max_chats: int = CONTEXT_CACHE_CHATS
+    ):
+        self.max_tokens = max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.fetch_rows = fetch_rows
+        self.max_chats = max_chats
+        self._chats: "OrderedDict[int, ChatContext]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.rows_fetched = 0
+        self.cold_loads = 0
+        self.summary_updates = 0
+        self.out_of_order = 0
+
+    def _get(self, chat_id: int) -> ChatContext:
+        context = self._chats.get(chat_id)
+        if context is None:
+            context = self._chats[chat_id] = ChatContext()
+            self.cold_loads += 1
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return context
+
+    def load_history(self, db: Session, chat_id: int, before_id: int) -> List[Dict[str, str]]:
+        """
+        Return the history to send to the model for the turn ending before `before_id`.
+        Blocking; call it from the database thread pool.
+        """
+        with self._lock:
+            last_id = self._get(chat_id).last_id
+
+        # Fetch only the newest rows we have not seen yet
+        rows = db.query(models.Message).filter(
+            models.Message.chat_id == chat_id,
+            models.Message.id > last_id,
+            models.Message.id < before_id
+        ).order_by(models.Message.id.desc()).limit(self.fetch_rows).all()
+
+        with self._lock:
+            context = self._get(chat_id)
+            for row in reversed(rows):
+                if row.id <= context.last_id or not row.content:
+                    continue
+                context.append(Turn(row.id, row.role, row.content, count_tokens(row.content)))
+            self.rows_fetched += len(rows)
+            if context.slide(self.max_tokens, self.summary_max_tokens):
+                self.summary_updates += 1
+            return context.messages()
+
+    def record(self, chat_id: int, message_id: int, role: str, content: str) -> None:
+        """
+        Add a message written by this process to a cached context, so the next turn need not read it back.
+        """
+        with self._lock:
+            context = self._chats.get(chat_id)
+            if context is None or not content:
+                return
+            if message_id <= context.last_id:
+                if not any(turn.id == message_id for turn in context.turns):
+                    # A concurrent turn already read past this message while it was still empty;
+                    # appending it now would put it out of order, so reload the chat next turn
+                    self._chats.pop(chat_id, None)
+                    self.out_of_order += 1
+                return
+            context.append(Turn(message_id, role, content, count_tokens(content)))
+
+    def invalidate(self, chat_id: int) -> None:
+        with self._lock:
+            self._chats.pop(chat_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chats_cached": len(self._chats),
+            "cold_loads": self.cold_loads,
+            "rows_fetched": self.rows_fetched,
+            "summary_updates": self.summary_updates,
+            "out_of_order_invalidations": self.out_of_order,
+            "max_tokens": self.max_tokens,
+        }
+
+
+_context_manager = None
+
+
+def get_context_manager() -> ConversationContextManager:
+    """
+    Get or create the shared conversation context manager.
+    """
+    global _context_manager
+    if _context_manager is None:
+        _context_manager = ConversationContextManager()
+    return _context_manager
@@ -1,15 +1,66 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
 import os
+import time
+
+from metrics import DB_CALL_SECONDS, current_route
 
 # Get database URL from environment or use default
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./chatbot.db")
 
+# Number of threads dedicated to blocking database work
+DB_POOL_WORKERS = int(os.getenv("DB_POOL_WORKERS", "8"))
+
+# Connection pool; keep DB_POOL_SIZE at least DB_POOL_WORKERS so worker threads never wait for a connection
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", str(DB_POOL_WORKERS)))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Checks connections before use; off by default for SQLite, where connections do not go stale
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false" if DATABASE_URL.startswith("sqlite") else "true").lower() == "true"
+
+# SQLite storage profile
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # safe with WAL: only the last commits can be lost on power failure
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.close()
+
+def create_db_engine(url: str):
+    """
+    Create an engine with the tuned pool settings, and the tuned pragmas on every SQLite connection.
+    """
+    if url.startswith("sqlite"):
+        options = {"connect_args": {"check_same_thread": False}}
+        if ":memory:" not in url and url != "sqlite://":
+            options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    else:
+        options = {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+        }
+    db_engine = create_engine(url, pool_pre_ping=DB_POOL_PRE_PING, **options)
+    if url.startswith("sqlite"):
+        event.listen(db_engine, "connect", _apply_sqlite_pragmas)
+    return db_engine
+
 # Create SQLAlchemy engine
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-)
+engine = create_db_engine(DATABASE_URL)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -17,6 +68,27 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Create base class for models
 Base = declarative_base()
 
+# Create missing tables and columns
+def migrate_schema():
+    """
+    Create missing tables, then add any model columns and indexes missing from tables
+    created by an older version of the app. New columns must be nullable.
+    """
+    Base.metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=conn)
+
 # Dependency to get database session
 def get_db():
     db = SessionLocal()
@@ -24,3 +96,29 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# Dedicated, bounded thread pool so database I/O never runs on the event loop
+_db_executor = None
+
+def get_db_executor() -> ThreadPoolExecutor:
+    global _db_executor
+    if _db_executor is None:
+        _db_executor = ThreadPoolExecutor(max_workers=DB_POOL_WORKERS, thread_name_prefix="db")
+    return _db_executor
+
+async def run_db(fn, *args, **kwargs):
+    """
+    Run a blocking database function in the database thread pool and await its result.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        return await loop.run_in_executor(get_db_executor(), functools.partial(fn, *args, **kwargs))
+    finally:
+        DB_CALL_SECONDS.observe(time.perf_counter() - started, route=current_route())
+
+def shutdown_db_executor():
+    global _db_executor
+    if _db_executor is not None:
+        _db_executor.shutdown(wait=True)
+        _db_executor = None
@@ -0,0 +1,141 @@
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+from embeddings import get_embedding_engine, EmbeddingEngine
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# How long the first request in a batch waits for company, and how many texts a batch may hold
+EMBEDDING_BATCH_MAX_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+EMBEDDING_BATCH_MAX_ITEMS = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS", "64"))
+# Threads running batched inference; ONNX already parallelizes inside one inference
+EMBEDDING_BATCH_WORKERS = int(os.getenv("EMBEDDING_BATCH_WORKERS", "1"))
+
+
+class EmbeddingBatcher:
+    """
+    Collects embedding requests from concurrent coroutines for a short window and runs
+    them as one batched inference in a worker thread.
+    """
+
+    def __init__(
+        self,
+        engine: EmbeddingEngine,
+        max_wait_ms: float = EMBEDDING_BATCH_MAX_WAIT_MS,
+        max_items: int = EMBEDDING_BATCH_MAX_ITEMS,
+        workers: int = EMBEDDING_BATCH_WORKERS
+    ):
+        self.engine = engine
+        self.max_wait = max_wait_ms / 1000
+        self.max_items = max_items
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed")
+        self._pending: List[Tuple[List[str], asyncio.Future, float]] = []
+        self._pending_items = 0
+        self._timer = None
+        self._running = set()
+        self.requests = 0
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.total_wait = 0.0
+        self.total_inference = 0.0
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts, sharing an inference with other concurrent callers.
+        """
+        if not texts:
+            return np.zeros((0, 384), dtype=np.float32)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((list(texts), future, time.perf_counter()))
+        self._pending_items += len(texts)
+        self.requests += 1
+
+        if self._pending_items >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending, self._pending_items = self._pending, [], 0
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[List[str], asyncio.Future, float]]) -> None:
+        started = time.perf_counter()
+        texts = [text for request_texts, _, _ in batch for text in request_texts]
+        self.total_wait += sum(started - enqueued for _, _, enqueued in batch)
+
+        try:
+            vectors = await asyncio.get_running_loop().run_in_executor(self._executor, self.engine.embed, texts)
+        except Exception as e:
+            logger.error(f"Batched embedding error: {str(e)}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.total_inference += time.perf_counter() - started
+        self.batches += 1
+        self.items += len(texts)
+        self.largest_batch = max(self.largest_batch, len(texts))
+
+        offset = 0
+        for request_texts, future, _ in batch:
+            if not future.done():
+                future.set_result(vectors[offset:offset + len(request_texts)])
+            offset += len(request_texts)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_wait_ms": self.max_wait * 1000,
+            "max_items": self.max_items,
+            "requests": self.requests,
+            "batches": self.batches,
+            "items": self.items,
+            "pending_items": self._pending_items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else None,
+            "largest_batch": self.largest_batch,
+            "avg_queue_wait_ms": round(self.total_wait / self.requests * 1000, 3) if self.requests else None,
+            "avg_inference_ms": round(self.total_inference / self.batches * 1000, 3) if self.batches else None,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+_batcher = None
+
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """
+    Get or create the shared embedding batcher.
+    """
+    global _batcher
+    if _batcher is None:
+        _batcher = EmbeddingBatcher(get_embedding_engine())
+    return _batcher
+
+
+def shutdown_embedding_batcher() -> None:
+    global _batcher
+    if _batcher is not None:
+        _batcher.shutdown()
+        _batcher = None
@@ -0,0 +1,178 @@
+import os
+import time
+import logging
+import threading
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from metrics import EMBEDDING_SECONDS, EMBEDDING_TEXTS
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# ONNX runtime threading (0 lets onnxruntime choose)
+EMBEDDING_INTRA_OP_THREADS = int(os.getenv("EMBEDDING_INTRA_OP_THREADS", "0"))
+EMBEDDING_INTER_OP_THREADS = int(os.getenv("EMBEDDING_INTER_OP_THREADS", "0"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+# Use a dynamically quantized int8 copy of the model (needs the `onnx` package to build it once)
+EMBEDDING_QUANTIZED = os.getenv("EMBEDDING_QUANTIZED", "false").lower() in ("1", "true", "yes")
+# Maximum tokens per text; all-MiniLM-L6-v2 was trained with 256
+EMBEDDING_MAX_LENGTH = 256
+
+
+class EmbeddingEngine:
+    """
+    Process-wide all-MiniLM-L6-v2 embedding model with configurable ONNX threading,
+    batching and an optional int8-quantized variant. Implements Chroma's embedding
+    function protocol without importing chromadb, which is slow to import.
+    """
+
+    def __init__(
+        self,
+        intra_op_threads: int = EMBEDDING_INTRA_OP_THREADS,
+        inter_op_threads: int = EMBEDDING_INTER_OP_THREADS,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        quantized: bool = EMBEDDING_QUANTIZED
+    ):
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.batch_size = batch_size
+        self.quantized = quantized
+        self._session = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+        self.texts_embedded = 0
+        self.batches = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._session is not None
+
+    def _model_dir(self) -> str:
+        # Reuse Chroma's downloader and cache location for the model files
+        from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+        downloader = ONNXMiniLM_L6_V2()
+        downloader._download_model_if_not_exists()
+        return os.path.join(downloader.DOWNLOAD_PATH, downloader.EXTRACTED_FOLDER_NAME)
+
+    def _quantized_model_path(self, model_path: str) -> str:
+        quantized_path = model_path.replace(".onnx", ".int8.onnx")
+        if not os.path.exists(quantized_path):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            logger.info("Building int8-quantized embedding model")
+            quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        return quantized_path
+
+    def load(self) -> None:
+        """
+        Load the tokenizer and ONNX session. Safe to call more than once.
+        """
+        if self._session is not None:
+            return
+        with self._lock:
+            if self._session is not None:
+                return
+            import onnxruntime
+            from tokenizers import Tokenizer
+
+            started = time.perf_counter()
+            model_dir = self._model_dir()
+            model_path = os.path.join(model_dir, "model.onnx")
+            if self.quantized:
+                try:
+                    model_path = self._quantized_model_path(model_path)
+                except ImportError:
+                    logger.warning("EMBEDDING_QUANTIZED is set but the 'onnx' package is not installed. Using the fp32 model.")
+                    self.quantized = False
+
+            tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+            tokenizer.enable_truncation(max_length=EMBEDDING_MAX_LENGTH)
+            # Pad to the longest text in each batch rather than to a fixed length
+            tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+            options = onnxruntime.SessionOptions()
+            options.log_severity_level = 3
+            options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if self.intra_op_threads:
+                options.intra_op_num_threads = self.intra_op_threads
+            if self.inter_op_threads:
+                options.inter_op_num_threads = self.inter_op_threads
+
+            self._session = onnxruntime.InferenceSession(
+                model_path, sess_options=options, providers=["CPUExecutionProvider"]
+            )
+            self._tokenizer = tokenizer
+            self.load_seconds = time.perf_counter() - started
+            logger.info(f"Embedding model loaded in {self.load_seconds:.2f}s (quantized={self.quantized})")
+
+    def warmup(self) -> None:
+        """
+        Load the model and run one inference so the first real request pays no setup cost.
+        """
+        self.load()
+        self.embed(["warm up"])
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts into L2-normalized float32 vectors.
+        """
+        self.load()
+        if not texts:
+            return np.zeros((0, 384), dtype=np.float32)
+
+        started = time.perf_counter()
+        results = []
+        for i in range(0, len(texts), self.batch_size):
+            encoded = self._tokenizer.encode_batch(texts[i:i + self.batch_size])
+            input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+            outputs = self._session.run(None, {
+                "input_ids": input_ids,
+                "attention_mask": attention_mask,
+                "token_type_ids": np.zeros_like(input_ids),
+            })
+            # Mean pooling over real tokens, then normalize
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (outputs[0] * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            results.append((pooled / np.clip(norms, 1e-12, None)).astype(np.float32))
+            self.batches += 1
+
+        self.texts_embedded += len(texts)
+        EMBEDDING_SECONDS.observe(time.perf_counter() - started)
+        EMBEDDING_TEXTS.inc(len(texts))
+        return np.concatenate(results)
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return self.embed(list(input)).tolist()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "quantized": self.quantized,
+            "intra_op_threads": self.intra_op_threads,
+            "inter_op_threads": self.inter_op_threads,
+            "batch_size": self.batch_size,
+            "texts_embedded": self.texts_embedded,
+            "batches": self.batches,
+        }
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_embedding_engine() -> EmbeddingEngine:
+    """
+    Get the process-wide embedding engine.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = EmbeddingEngine()
+    return _engine
@@ -0,0 +1,183 @@
+import os
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator
+
+import httpx
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Connection pool configuration (shared by every upstream)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "10"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Per-upstream timeouts in seconds
+UPSTREAM_TIMEOUTS = {
+    "groq": float(os.getenv("GROQ_TIMEOUT", "60")),
+    "tavily": float(os.getenv("TAVILY_TIMEOUT", "30")),
+}
+
+DEFAULT_TIMEOUT = 30.0
+
+
+def _http2_available() -> bool:
+    """
+    HTTP/2 needs the optional `h2` package; fall back to HTTP/1.1 without it.
+    """
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class UpstreamClient:
+    """
+    A long-lived, pooled httpx client for a single upstream API.
+    Tracks request counts, in-flight requests, new connections and pool timeouts.
+    """
+
+    def __init__(self, name: str, timeout: float, limits: httpx.Limits, http2: bool = False):
+        self.name = name
+        self.limits = limits
+        self.http2 = http2
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, pool=HTTP_POOL_TIMEOUT),
+            limits=limits,
+            http2=http2,
+        )
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.connections_opened = 0
+        self.pool_timeouts = 0
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        # httpcore emits this once per new TCP connection; anything else was a reuse
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    def _begin(self) -> None:
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def _end(self) -> None:
+        self.in_flight -= 1
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        """
+        Send a POST request and read the full response body.
+        """
+        self._begin()
+        try:
+            return await self._client.post(url, extensions={"trace": self._trace}, **kwargs)
+        except httpx.PoolTimeout:
+            self.pool_timeouts += 1
+            raise
+        finally:
+            self._end()
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """
+        Open a streaming request. The connection goes back to the pool when the block exits.
+        """
+        self._begin()
+        try:
+            async with self._client.stream(method, url, extensions={"trace": self._trace}, **kwargs) as response:
+                yield response
+        except httpx.PoolTimeout:
+            self.pool_timeouts += 1
+            raise
+        finally:
+            self._end()
+
+    def _pool_connections(self) -> Dict[str, int]:
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None) or []
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return {"open": len(connections), "idle": idle, "active": len(connections) - idle}
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return pool saturation and connection reuse statistics.
+        """
+        max_connections = self.limits.max_connections or 0
+        reused = max(self.requests - self.connections_opened, 0)
+        return {
+            "http2": self.http2,
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "max_connections": max_connections,
+            "saturation": round(self.in_flight / max_connections, 3) if max_connections else None,
+            "connections_opened": self.connections_opened,
+            "connections_reused": reused,
+            "reuse_ratio": round(reused / self.requests, 3) if self.requests else None,
+            "pool_timeouts": self.pool_timeouts,
+            "pool": self._pool_connections(),
+        }
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+
+# Client registry
+_clients: Dict[str, UpstreamClient] = {}
+
+
+def _create_client(name: str) -> UpstreamClient:
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    http2 = HTTP2_ENABLED and _http2_available()
+    if HTTP2_ENABLED and not http2:
+        logger.warning("HTTP2_ENABLED is set but the 'h2' package is not installed. Using HTTP/1.1.")
+    timeout = UPSTREAM_TIMEOUTS.get(name, DEFAULT_TIMEOUT)
+    logger.info(f"Creating HTTP client for {name} (timeout={timeout}s, http2={http2})")
+    return UpstreamClient(name, timeout=timeout, limits=limits, http2=http2)
+
+
+def init_http_clients() -> None:
+    """
+    Create the shared clients for every known upstream. Called from the app lifespan.
+    """
+    for name in UPSTREAM_TIMEOUTS:
+        if name not in _clients:
+            _clients[name] = _create_client(name)
+
+
+async def close_http_clients() -> None:
+    """
+    Close all shared clients. Called when the app shuts down.
+    """
+    for name, client in list(_clients.items()):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.error(f"Error closing HTTP client {name}: {str(e)}")
+    _clients.clear()
+
+
+def get_http_client(name: str) -> UpstreamClient:
+    """
+    Get the shared client for an upstream, creating it lazily if the lifespan hook has not run.
+    """
+    client = _clients.get(name)
+    if client is None:
+        client = _clients[name] = _create_client(name)
+    return client
+
+
+def get_http_client_stats() -> Dict[str, Any]:
+    """
+    Return statistics for every registered client.
+    """
+    return {name: client.stats() for name, client in _clients.items()}
@@ -0,0 +1,169 @@
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Tuple
+
+import models
+from database import SessionLocal, run_db
+from pdf_extract import count_pages, extract_pages
+from lexical_index import build_index
+from metrics import INGESTION_PAGES, INGESTION_PAGES_PER_SECOND, start_span, end_span
+from vector_db import add_chunks_to_chroma, get_vector_store, split_text
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Ingestion pipeline configuration
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+INGEST_PAGES_PER_TASK = int(os.getenv("INGEST_PAGES_PER_TASK", "8"))
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "64"))
+# Extraction tasks in flight per document; bounds memory for very large PDFs
+INGEST_MAX_PENDING_TASKS = int(os.getenv("INGEST_MAX_PENDING_TASKS", str(INGEST_WORKERS * 2)))
+
+_process_pool = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Get or create the process pool used for PDF text extraction.
+    """
+    global _process_pool
+    if _process_pool is None:
+        # Spawn rather than fork: the parent process runs several thread pools
+        _process_pool = ProcessPoolExecutor(
+            max_workers=INGEST_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+def shutdown_process_pool() -> None:
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+def _update_pdf(pdf_id: str, content_hash: str = None, **values) -> None:
+    """
+    Update the PDF row, and every other upload of the same content, with ingestion progress.
+    """
+    db = SessionLocal()
+    try:
+        if content_hash:
+            rows = db.query(models.PDF).filter(models.PDF.content_hash == content_hash)
+        else:
+            rows = db.query(models.PDF).filter(models.PDF.id == pdf_id)
+        rows.update(values, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _detect_language(text: str) -> str:
+    from langdetect import detect
+
+    try:
+        return detect(text[:1000])  # Use first 1000 chars for detection
+    except:
+        return "en"  # Default to English if detection fails
+
+
+class _ChunkBuffer:
+    """
+    Collects chunks from extracted pages and flushes them to the vector store in fixed-size batches.
+    """
+
+    def __init__(self, index_id: str, file_path: str, batch_size: int):
+        self.index_id = index_id
+        self.file_path = file_path
+        self.batch_size = batch_size
+        self.language = None
+        self.chunks: List[str] = []
+        self.ids: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.indexed = 0
+        # Every chunk is kept for the lexical index, which is built once ingestion completes
+        self.all_ids: List[str] = []
+        self.all_chunks: List[str] = []
+
+    def add_pages(self, pages: List[Tuple[int, str]]) -> None:
+        for page_num, text in pages:
+            if not text.strip():
+                continue
+            if self.language is None:
+                self.language = _detect_language(text)
+            for i, chunk in enumerate(split_text(text)):
+                chunk_id = f"{self.index_id}_p{page_num}_{i}"
+                self.chunks.append(chunk)
+                self.ids.append(chunk_id)
+                self.all_chunks.append(chunk)
+                self.all_ids.append(chunk_id)
+                self.metadatas.append({"source": self.file_path, "language": self.language, "page": page_num + 1})
+
+    async def flush(self, force: bool = False) -> None:
+        while len(self.chunks) >= self.batch_size or (force and self.chunks):
+            n = self.batch_size
+            await add_chunks_to_chroma(self.index_id, self.chunks[:n], self.ids[:n], self.metadatas[:n])
+            self.indexed += len(self.chunks[:n])
+            del self.chunks[:n], self.ids[:n], self.metadatas[:n]
+
+
+async def ingest_pdf(pdf_id: str, file_path: str, content_hash: str = None) -> None:
+    """
+    Extract, chunk and embed a PDF incrementally. Pages are extracted in a process pool and
+    indexed in batches as they arrive, so the document is searchable while ingestion runs.
+    Progress is recorded on every PDF row that shares the content.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    index_id = models.pdf_index_id(pdf_id, content_hash)
+    started = time.perf_counter()
+    span = start_span("pdf.ingest", pdf_id=pdf_id)
+    pages_processed = 0
+    try:
+        page_count = await loop.run_in_executor(pool, count_pages, file_path)
+        await run_db(_update_pdf, pdf_id, content_hash, processed=models.PDF_PROCESSING, page_count=page_count, pages_processed=0, chunks_indexed=0)
+        await get_vector_store().get_or_create_collection(index_id)
+
+        ranges = [(start, min(start + INGEST_PAGES_PER_TASK, page_count)) for start in range(0, page_count, INGEST_PAGES_PER_TASK)]
+        buffer = _ChunkBuffer(index_id, file_path, INGEST_EMBED_BATCH)
+        pending = set()
+
+        while ranges or pending:
+            # Keep a bounded number of extraction tasks in flight
+            while ranges and len(pending) < INGEST_MAX_PENDING_TASKS:
+                start, end = ranges.pop(0)
+                pending.add(loop.run_in_executor(pool, extract_pages, file_path, start, end))
+
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                pages = future.result()
+                # Language detection and tokenization are CPU-bound; keep them off the event loop
+                await asyncio.to_thread(buffer.add_pages, pages)
+                pages_processed += len(pages)
+                INGESTION_PAGES.inc(len(pages))
+
+            await buffer.flush()
+            await run_db(_update_pdf, pdf_id, content_hash, pages_processed=pages_processed, chunks_indexed=buffer.indexed)
+
+        await buffer.flush(force=True)
+        try:
+            await asyncio.to_thread(build_index, index_id, buffer.all_ids, buffer.all_chunks)
+        except Exception as e:
+            # Hybrid retrieval falls back to vector hits only without a lexical index
+            logger.error(f"Error building lexical index for PDF {pdf_id}: {str(e)}")
+        await run_db(_update_pdf, pdf_id, content_hash, processed=models.PDF_PROCESSED, pages_processed=pages_processed, chunks_indexed=buffer.indexed)
+        elapsed = time.perf_counter() - started
+        if pages_processed and elapsed > 0:
+            INGESTION_PAGES_PER_SECOND.observe(pages_processed / elapsed)
+        logger.info(f"PDF {pdf_id} processed: {pages_processed} pages, {buffer.indexed} chunks")
+
+    except Exception as e:
+        logger.error(f"Error processing PDF {pdf_id}: {str(e)}")
+        await run_db(_update_pdf, pdf_id, content_hash, processed=models.PDF_FAILED)
+    finally:
+        end_span(span, pages=pages_processed)
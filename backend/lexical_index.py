@@ -0,0 +1,165 @@
+import os
+import re
+import json
+import math
+import shutil
+import logging
+import threading
+from collections import Counter
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+from cachetools import LRUCache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# BM25 indexes are stored next to the Chroma data directory
+LEXICAL_INDEX_DIR = os.getenv(
+    "LEXICAL_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(os.getenv("CHROMA_PERSIST_DIR", "./chroma_db"))), "lexical_index")
+)
+# Number of memory-mapped indexes kept open
+LEXICAL_INDEX_CACHE_SIZE = int(os.getenv("LEXICAL_INDEX_CACHE_SIZE", "256"))
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Identifiers such as "ABX-1042", "v2.3.1" or "12.4(b)" stay whole; their parts are indexed too
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._\-/][a-z0-9]+)*")
+PART_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase lexical tokens, keeping compound identifiers and their parts.
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(PART_PATTERN.findall(token))
+    return tokens
+
+
+def _index_path(document_id: str) -> str:
+    return os.path.join(LEXICAL_INDEX_DIR, document_id)
+
+
+def build_index(document_id: str, chunk_ids: List[str], chunks: List[str]) -> None:
+    """
+    Build a BM25 inverted index for a document and write it atomically to disk.
+    Postings, term frequencies and chunk lengths are stored as .npy arrays so they can be memory-mapped.
+    """
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    doc_lens = np.zeros(len(chunks), dtype=np.int32)
+    for doc_index, chunk in enumerate(chunks):
+        counts = Counter(tokenize(chunk))
+        doc_lens[doc_index] = sum(counts.values())
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((doc_index, tf))
+
+    terms = {}
+    doc_array = []
+    tf_array = []
+    offset = 0
+    for term in sorted(postings):
+        entries = postings[term]
+        terms[term] = [offset, len(entries)]
+        doc_array.extend(doc for doc, _ in entries)
+        tf_array.extend(min(tf, 65535) for _, tf in entries)
+        offset += len(entries)
+
+    final_dir = _index_path(document_id)
+    temp_dir = f"{final_dir}.tmp"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    np.save(os.path.join(temp_dir, "postings.npy"), np.array(doc_array, dtype=np.int32))
+    np.save(os.path.join(temp_dir, "tfs.npy"), np.array(tf_array, dtype=np.uint16))
+    np.save(os.path.join(temp_dir, "doc_lens.npy"), doc_lens)
+    with open(os.path.join(temp_dir, "terms.json"), "w", encoding="utf-8") as f:
+        json.dump({"terms": terms, "chunk_ids": chunk_ids}, f)
+
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.replace(temp_dir, final_dir)
+    _indexes.pop(document_id, None)
+    logger.info(f"Built lexical index for {document_id}: {len(chunks)} chunks, {len(terms)} terms")
+
+
+class LexicalIndex:
+    """
+    Read-only, memory-mapped BM25 index over the chunks of one document.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "terms.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.terms: Dict[str, List[int]] = meta["terms"]
+        self.chunk_ids: List[str] = meta["chunk_ids"]
+        self.postings = np.load(os.path.join(path, "postings.npy"), mmap_mode="r")
+        self.tfs = np.load(os.path.join(path, "tfs.npy"), mmap_mode="r")
+        self.doc_lens = np.load(os.path.join(path, "doc_lens.npy"), mmap_mode="r")
+        self.avg_len = float(self.doc_lens.mean()) if len(self.doc_lens) else 0.0
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """
+        Return up to top_k (chunk_id, score) pairs ranked by BM25.
+        """
+        count = len(self.chunk_ids)
+        if count == 0:
+            return []
+        scores = np.zeros(count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            entry = self.terms.get(term)
+            if entry is None:
+                continue
+            offset, df = entry
+            docs = self.postings[offset:offset + df]
+            tfs = self.tfs[offset:offset + df].astype(np.float32)
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lens[docs] / max(self.avg_len, 1e-9))
+            scores[docs] += idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+
+        matched = np.flatnonzero(scores)
+        if len(matched) == 0:
+            return []
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k)[:top_k]]
+        ranked = matched[np.argsort(-scores[matched])]
+        return [(self.chunk_ids[i], float(scores[i])) for i in ranked]
+
+
+_indexes = LRUCache(maxsize=LEXICAL_INDEX_CACHE_SIZE)
+_indexes_lock = threading.Lock()
+
+
+def get_index(document_id: str) -> Optional[LexicalIndex]:
+    """
+    Open the lexical index for a document, or None if it has not been built (yet).
+    """
+    with _indexes_lock:
+        index = _indexes.get(document_id)
+        if index is None:
+            path = _index_path(document_id)
+            if not os.path.exists(os.path.join(path, "terms.json")):
+                return None
+            index = _indexes[document_id] = LexicalIndex(path)
+        return index
+
+
+def search(document_id: str, query: str, top_k: int) -> List[Tuple[str, float]]:
+    index = get_index(document_id)
+    return index.search(query, top_k) if index is not None else []
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse several ranked id lists: each id scores the sum of 1 / (k + rank) over the lists it appears in.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, 1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
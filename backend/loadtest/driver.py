@@ -0,0 +1,256 @@
+"""
+End-to-end load driver for the chat stream.
+
+Registers users, creates one chat per stream, then runs N concurrent SSE chats
+against /chats/{id}/messages and reports, as JSON, percentiles of time to first
+token, inter-token latency, total reply time and queue wait, plus throughput and
+error counts.
+
+With --spawn it first starts the fake Groq and Tavily servers and the API itself
+(against a throwaway database and vector store), so a run needs no network or
+API keys. Otherwise it targets an already running API at --base-url.
+
+Usage (from backend/):
+    python -m loadtest.driver --spawn --users 20 --streams 100 --turns 3 --search
+    python -m loadtest.driver --base-url http://127.0.0.1:8000 --streams 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Upstream failures reach the client as a reply starting with ai_service.ERROR_MESSAGE_PREFIX
+UPSTREAM_ERROR_PREFIX = "I'm sorry, an error occurred"
+
+
+def percentiles(values, scale=1000):
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def pick(pct):
+        return round(ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] * scale, 1)
+
+    return {"count": len(ordered), "p50": pick(50), "p90": pick(90), "p99": pick(99), "max": round(ordered[-1] * scale, 1)}
+
+
+async def register(client, run_id, index):
+    username = f"load-{run_id}-{index}"
+    response = await client.post("/auth/register", json={
+        "username": username, "email": f"{username}@example.com", "password": "load-test-password"
+    })
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def create_chat(client, token):
+    response = await client.post("/chats", json={"title": "New Chat"}, headers={"Authorization": f"Bearer {token}"})
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+async def chat_turn(client, chat_id, token, message, search, results):
+    """
+    Send one message over SSE and record its timings in `results`.
+    """
+    params = {"message": message, "token": token, "search": str(search).lower()}
+    started = time.perf_counter()
+    first_token = None
+    last_token = None
+    admitted = None
+    tokens = 0
+    try:
+        async with client.stream("GET", f"/chats/{chat_id}/messages", params=params) as response:
+            if response.status_code != 200:
+                results["errors"][f"http_{response.status_code}"] = results["errors"].get(f"http_{response.status_code}", 0) + 1
+                return
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                event = json.loads(line[6:])
+                now = time.perf_counter()
+                if event["type"] == "queue":
+                    results["queued"] += 1
+                elif event["type"] == "content":
+                    if first_token is None:
+                        if event["content"].startswith(UPSTREAM_ERROR_PREFIX):
+                            results["errors"]["upstream_error"] = results["errors"].get("upstream_error", 0) + 1
+                            return
+                        first_token = now
+                        results["ttft"].append(now - started)
+                    else:
+                        results["inter_token"].append(now - last_token)
+                    last_token = now
+                    tokens += 1
+                elif event["type"] == "timings":
+                    admitted = now
+                elif event["type"] == "error":
+                    results["errors"]["stream_error"] = results["errors"].get("stream_error", 0) + 1
+                    return
+                elif event["type"] == "end":
+                    break
+    except (httpx.HTTPError, json.JSONDecodeError) as e:
+        results["errors"][type(e).__name__] = results["errors"].get(type(e).__name__, 0) + 1
+        return
+
+    if first_token is None:
+        results["errors"]["empty_reply"] = results["errors"].get("empty_reply", 0) + 1
+        return
+    finished = time.perf_counter()
+    results["completed"] += 1
+    results["tokens"] += tokens
+    results["total"].append(finished - started)
+    if admitted is not None:
+        # Time from the end of retrieval to the first token: admission queueing plus upstream TTFT
+        results["after_retrieval"].append(first_token - admitted)
+
+
+async def run_load(args):
+    run_id = uuid.uuid4().hex[:8]
+    limits = httpx.Limits(max_connections=args.streams + 10, max_keepalive_connections=args.streams + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        tokens = await asyncio.gather(*(register(client, run_id, i) for i in range(args.users)))
+        stream_tokens = [tokens[i % args.users] for i in range(args.streams)]
+        chat_ids = await asyncio.gather(*(create_chat(client, token) for token in stream_tokens))
+
+        results = {
+            "completed": 0, "tokens": 0, "queued": 0, "errors": {},
+            "ttft": [], "inter_token": [], "total": [], "after_retrieval": [],
+        }
+
+        async def stream(index):
+            for turn in range(args.turns):
+                message = f"{args.message} (stream {index}, turn {turn})"
+                await chat_turn(client, chat_ids[index], stream_tokens[index], message, args.search, results)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(stream(i) for i in range(args.streams)))
+        elapsed = time.perf_counter() - started
+
+        server_stats = None
+        try:
+            stats = (await client.get("/stats")).json()
+            server_stats = {key: stats.get(key) for key in ("admission", "upstream_retries", "streams", "message_writer")}
+        except (httpx.HTTPError, ValueError):
+            pass
+
+    attempted = args.streams * args.turns
+    failed = sum(results["errors"].values())
+    return {
+        "users": args.users,
+        "streams": args.streams,
+        "turns": args.turns,
+        "search": args.search,
+        "elapsed_s": round(elapsed, 2),
+        "replies_completed": results["completed"],
+        "replies_per_sec": round(results["completed"] / elapsed, 2),
+        "tokens_per_sec": round(results["tokens"] / elapsed, 1),
+        "error_rate": round(failed / attempted, 4) if attempted else 0.0,
+        "errors": results["errors"],
+        "queue_events": results["queued"],
+        "ttft_ms": percentiles(results["ttft"]),
+        "inter_token_ms": percentiles(results["inter_token"]),
+        "total_ms": percentiles(results["total"]),
+        "retrieval_to_first_token_ms": percentiles(results["after_retrieval"]),
+        "server": server_stats,
+    }
+
+
+def wait_until_up(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def spawn_stack(args, workdir):
+    """
+    Start the fake upstreams and the API as subprocesses; returns the processes.
+    """
+    groq = [
+        sys.executable, "-m", "loadtest.fake_groq", "--port", str(args.groq_port),
+        "--ttft", str(args.ttft), "--tokens-per-sec", str(args.tokens_per_sec),
+        "--reply-tokens", str(args.reply_tokens),
+        "--rate-limit", str(args.rate_limit), "--error-rate", str(args.error_rate),
+    ]
+    tavily = [
+        sys.executable, "-m", "loadtest.fake_tavily", "--port", str(args.tavily_port),
+        "--latency", str(args.tavily_latency), "--error-rate", str(args.tavily_error_rate),
+    ]
+    env = dict(
+        os.environ,
+        GROQ_API_URL=f"http://127.0.0.1:{args.groq_port}/openai/v1/chat/completions",
+        GROQ_API_KEY="fake",
+        TAVILY_API_URL=f"http://127.0.0.1:{args.tavily_port}/search",
+        TAVILY_API_KEY="fake",
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'load.db')}",
+        CHROMA_PERSIST_DIR=os.path.join(workdir, "chroma_db"),
+    )
+    api = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.api_port), "--log-level", "warning"]
+
+    processes = []
+    for command in (groq, tavily, api):
+        processes.append(subprocess.Popen(
+            command, cwd=workdir if command is api else BACKEND_DIR, env=dict(env, PYTHONPATH=BACKEND_DIR),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        ))
+    wait_until_up(f"http://127.0.0.1:{args.groq_port}/stats")
+    wait_until_up(f"http://127.0.0.1:{args.tavily_port}/stats")
+    wait_until_up(f"http://127.0.0.1:{args.api_port}/", timeout=180)
+    return processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--streams", type=int, default=50, help="concurrent chats")
+    parser.add_argument("--turns", type=int, default=2, help="messages sent one after another on each chat")
+    parser.add_argument("--message", default="Tell me something interesting")
+    parser.add_argument("--search", action="store_true", help="enable web search on every message")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    spawn = parser.add_argument_group("spawned stack (--spawn)")
+    spawn.add_argument("--spawn", action="store_true", help="start the fake upstreams and the API locally")
+    spawn.add_argument("--api-port", type=int, default=8765)
+    spawn.add_argument("--groq-port", type=int, default=9100)
+    spawn.add_argument("--tavily-port", type=int, default=9101)
+    spawn.add_argument("--ttft", type=float, default=0.2)
+    spawn.add_argument("--tokens-per-sec", type=float, default=50.0)
+    spawn.add_argument("--reply-tokens", type=int, default=30)
+    spawn.add_argument("--rate-limit", type=float, default=0.0, help="share of Groq requests answered with 429")
+    spawn.add_argument("--error-rate", type=float, default=0.0, help="share of Groq requests answered with 500")
+    spawn.add_argument("--tavily-latency", type=float, default=0.3)
+    spawn.add_argument("--tavily-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if not args.spawn:
+        print(json.dumps(asyncio.run(run_load(args)), indent=2))
+        return
+
+    with tempfile.TemporaryDirectory(prefix="loadtest_") as workdir:
+        processes = spawn_stack(args, workdir)
+        try:
+            args.base_url = f"http://127.0.0.1:{args.api_port}"
+            print(json.dumps(asyncio.run(run_load(args)), indent=2))
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Local stand-in for the Groq chat completions API.
+
+Streams OpenAI-style SSE chunks at a configurable time to first token and
+tokens/sec, and answers a configurable share of requests with 429 Too Many
+Requests (with a Retry-After header) or 500 Internal Server Error, so that
+admission control, backoff and streaming can be exercised without touching the
+real API.
+
+Usage (from backend/):
+    python -m loadtest.fake_groq --port 9100 --ttft 0.3 --tokens-per-sec 50 --rate-limit 0.1 --error-rate 0.01
+    GROQ_API_URL=http://127.0.0.1:9100/openai/v1/chat/completions GROQ_API_KEY=fake uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+REPLY = (
+    "This is a synthetic reply from the fake Groq server. It streams one word at a time "
+    "so that time to first token and streaming throughput can be measured end to end."
+).split()
+
+app = FastAPI(title="Fake Groq")
+settings = argparse.Namespace(rate_limit=0.0, retry_after=1.0, error_rate=0.0, ttft=0.2, tokens_per_sec=50.0, reply_tokens=len(REPLY))
+counters = {"requests": 0, "rate_limited": 0, "errors": 0, "completed": 0, "cancelled": 0}
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    counters["requests"] += 1
+    if random.random() < settings.rate_limit:
+        counters["rate_limited"] += 1
+        return JSONResponse(
+            {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+            status_code=429,
+            headers={"Retry-After": str(settings.retry_after)},
+        )
+    if random.random() < settings.error_rate:
+        counters["errors"] += 1
+        return JSONResponse({"error": {"message": "Internal server error", "type": "server_error"}}, status_code=500)
+
+    max_tokens = int(body.get("max_tokens", settings.reply_tokens))
+    words = [REPLY[i % len(REPLY)] for i in range(min(max_tokens, settings.reply_tokens))]
+
+    async def events():
+        created = int(time.time())
+        try:
+            await asyncio.sleep(settings.ttft)
+            for i, word in enumerate(words):
+                if i:
+                    await asyncio.sleep(1 / settings.tokens_per_sec)
+                chunk = {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "delta": {"content": word + (" " if i < len(words) - 1 else "")}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+            counters["completed"] += 1
+        except asyncio.CancelledError:
+            counters["cancelled"] += 1
+            raise
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+async def stats():
+    return counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 500")
+    parser.add_argument("--ttft", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--reply-tokens", type=int, default=len(REPLY), help="tokens per reply (capped by max_tokens)")
+    args = parser.parse_args()
+
+    settings.rate_limit = args.rate_limit
+    settings.retry_after = args.retry_after
+    settings.error_rate = args.error_rate
+    settings.ttft = args.ttft
+    settings.tokens_per_sec = args.tokens_per_sec
+    settings.reply_tokens = args.reply_tokens
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
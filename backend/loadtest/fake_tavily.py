@@ -0,0 +1,67 @@
+"""
+Local stand-in for the Tavily search API.
+
+Answers POST /search with synthetic results after a configurable latency, and
+fails a configurable share of requests with 500 Internal Server Error.
+
+Usage (from backend/):
+    python -m loadtest.fake_tavily --port 9101 --latency 0.4 --error-rate 0.02
+    TAVILY_API_URL=http://127.0.0.1:9101/search TAVILY_API_KEY=fake uvicorn main:app
+"""
+import argparse
+import asyncio
+import random
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Fake Tavily")
+settings = argparse.Namespace(latency=0.3, jitter=0.1, error_rate=0.0)
+counters = {"requests": 0, "errors": 0}
+
+
+@app.post("/search")
+async def search(request: Request):
+    body = await request.json()
+    counters["requests"] += 1
+    await asyncio.sleep(max(0.0, settings.latency + random.uniform(-settings.jitter, settings.jitter)))
+    if random.random() < settings.error_rate:
+        counters["errors"] += 1
+        return JSONResponse({"detail": "Internal server error"}, status_code=500)
+
+    query = body.get("query", "")
+    results = [
+        {
+            "title": f"Result {i + 1} for {query}",
+            "url": f"https://example.com/{i + 1}",
+            "content": f"Synthetic search result {i + 1} about {query}. " * 5,
+            "score": round(1 - i * 0.1, 2),
+        }
+        for i in range(int(body.get("max_results", 5)))
+    ]
+    return {"query": query, "results": results}
+
+
+@app.get("/stats")
+async def stats():
+    return counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9101)
+    parser.add_argument("--latency", type=float, default=0.3, help="mean response time in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="uniform +/- jitter on the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 500")
+    args = parser.parse_args()
+
+    settings.latency = args.latency
+    settings.jitter = args.jitter
+    settings.error_rate = args.error_rate
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,50 @@
 import logging
 import os
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 import uvicorn
 import asyncio
 import json
+import time
 import uuid
 from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 # Import local modules
-from database import get_db, engine, Base
+from database import get_db, engine, Base, run_db, shutdown_db_executor
 import models
 import schemas
-from auth import create_access_token, get_current_user, get_password_hash, verify_password, SECRET_KEY, ALGORITHM
+from auth import (
+    create_access_token, get_current_user, get_password_hash_async, verify_password_async,
+    resolve_token, get_token_cache, shutdown_password_executor
+)
 from fastapi import Request, Query
-from jose import jwt, JWTError
 from fastapi import status
-from ai_service import generate_response, search_web, process_pdf, query_pdf
-from vector_db import add_document_to_chroma, get_chroma_client
-from sqlalchemy.orm import joinedload
+from ai_service import (
+    generate_cached_response, retrieve_context, process_pdf, cancel_upstream, record_completed_stream,
+    get_stream_stats, get_upstream_retry_stats
+)
+from vector_db import add_document_to_chroma, get_chroma_client, get_vector_store, shutdown_vector_store, get_query_embedding_cache_stats, MAX_PDFS_PER_QUERY
+from http_clients import init_http_clients, close_http_clients, get_http_client_stats
+from conversation import get_context_manager
+from semantic_cache import get_semantic_cache
+from search_cache import get_search_cache, close_search_cache
+from ingestion import shutdown_process_pool
+from embeddings import get_embedding_engine
+from embedding_batcher import get_embedding_batcher, shutdown_embedding_batcher
+from uploads import save_upload, UploadLimitMiddleware
+from message_writer import StreamCheckpointer, get_message_writer, stop_message_writer
+from admission import get_admission_controller, AdmissionRejected, ADMISSION_MAX_WAIT, ADMISSION_POSITION_INTERVAL
+from sqlalchemy.orm import selectinload
+from chat_pages import list_chat_summaries, list_messages, InvalidCursor, PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT
+from metrics import MetricsMiddleware, SSE_ACTIVE_STREAMS, init_tracing, shutdown_tracing, render_metrics
+from readiness import get_readiness
 
 # Load environment variables
 
@@ -40,10 +60,36 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: create database tables and add any missing columns, and open the shared upstream
+    # HTTP clients. The vector store and embedding model warm up in the background, so the server
+    # accepts connections right away; /readyz reports when they are done.
+    readiness = get_readiness()
+    await readiness.prepare_database()
+    init_http_clients()
+    get_message_writer().start()
+    readiness.start_warmup()
+    yield
+    # Shutdown: flush pending message writes, then close pooled connections and the database thread pool
+    await readiness.stop()
+    await stop_message_writer()
+    await close_http_clients()
+    close_search_cache()
+    shutdown_process_pool()
+    shutdown_embedding_batcher()
+    shutdown_vector_store()
+    shutdown_password_executor()
+    shutdown_db_executor()
+    shutdown_tracing()
+
+app = FastAPI(title="AI Chatbot API", lifespan=lifespan)
 
-app = FastAPI(title="AI Chatbot API")
+# Record per-route latency for /metrics, and export traces when enabled
+app.add_middleware(MetricsMiddleware)
+# Cut off oversized or non-PDF uploads while they arrive, before Starlette has spooled them whole
+app.add_middleware(UploadLimitMiddleware)
+init_tracing(app)
 
 # Configure CORS
 app.add_middleware(
@@ -56,6 +102,8 @@ app.add_middleware(
 
 # OAuth2 scheme for token authentication
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+# Same scheme for routes where the token is optional
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
 
 # Create upload directory if it doesn't exist
 UPLOAD_DIR = "uploads"
@@ -67,25 +115,61 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 async def root():
     return {"message": "AI Chatbot API is running"}
 
+@app.get("/stats")
+async def get_stats():
+    return {
+        "http_clients": get_http_client_stats(),
+        "auth_token_cache": get_token_cache().stats(),
+        "conversation_context": get_context_manager().stats(),
+        "message_writer": get_message_writer().stats(),
+        "streams": get_stream_stats(),
+        "admission": get_admission_controller().stats(),
+        "upstream_retries": get_upstream_retry_stats(),
+        "semantic_cache": get_semantic_cache().stats() if get_semantic_cache() else {"enabled": False},
+        "search_cache": get_search_cache().stats(),
+        "embeddings": get_embedding_engine().stats(),
+        "embedding_batcher": get_embedding_batcher().stats(),
+        "vector_store": get_vector_store().stats(),
+        "query_embedding_cache": get_query_embedding_cache_stats()
+    }
+
+@app.get("/healthz")
+async def healthz():
+    # Liveness only: the process is up and the event loop is responsive
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    ready, report = await get_readiness().check()
+    return JSONResponse(report, status_code=200 if ready else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Auth routes
 @app.post("/auth/register", response_model=schemas.TokenResponse)
 async def register(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
     try:
         # Check if user already exists
-        db_user = db.query(models.User).filter(models.User.email == user_data.email).first()
+        db_user = await run_db(lambda: db.query(models.User).filter(models.User.email == user_data.email).first())
         if db_user:
             raise HTTPException(status_code=400, detail="Email already registered")
         
         # Create new user
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await get_password_hash_async(user_data.password)
         db_user = models.User(
             username=user_data.username,
             email=user_data.email,
             hashed_password=hashed_password
         )
-        db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        
+        def save_user():
+            db.add(db_user)
+            db.commit()
+            db.refresh(db_user)
+        
+        await run_db(save_user)
         
         # Create access token
         access_token = create_access_token(data={"sub": db_user.email})
@@ -98,15 +182,15 @@ async def register(user_data: schemas.UserCreate, db: Session = Depends(get_db))
     except Exception as e:
         import traceback
         logger.error(f"Registration error: {str(e)}\n{traceback.format_exc()}")
-        db.rollback()
+        await run_db(db.rollback)
         raise HTTPException(status_code=500, detail="Internal server error. Check backend logs for details.")
 
 @app.post("/auth/login", response_model=schemas.TokenResponse)
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     try:
         # Find user by email
-        user = db.query(models.User).filter(models.User.email == form_data.username).first()
-        if not user or not verify_password(form_data.password, user.hashed_password):
+        user = await run_db(lambda: db.query(models.User).filter(models.User.email == form_data.username).first())
+        if not user or not await verify_password_async(form_data.password, user.hashed_password):
             raise HTTPException(
                 status_code=401,
                 detail="Incorrect email or password",
@@ -132,19 +216,30 @@ async def get_current_user_info(current_user: models.User = Depends(get_current_
     return current_user
 
 @app.post("/auth/logout")
-async def logout():
-    # In a stateless JWT setup, the client is responsible for discarding the token
-    # This endpoint is provided for API completeness
+async def logout(token: Optional[str] = Depends(optional_oauth2_scheme)):
+    # In a stateless JWT setup, the client is responsible for discarding the token;
+    # the server only forgets its cached verification
+    if token:
+        get_token_cache().invalidate_token(token)
     return {"message": "Successfully logged out"}
 
 #Chat routes
 @app.get("/chats", response_model=List[schemas.Chat])
 async def get_chats(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
     try:
-        # from sqlalchemy.orm import joinedload
-        # chats = db.query(models.Chat).options(joinedload(models.Chat.messages)).filter(models.Chat.user_id == current_user.id).order_by(models.Chat.updated_at.desc()).all()
-        chats = db.query(models.Chat).filter(models.Chat.user_id == current_user.id).order_by(models.Chat.updated_at.desc()).all()
-        return chats
+        def load_chats():
+            # Load all messages in one extra query instead of one query per chat;
+            # prefer /chats/summaries and /chats/{id}/history for large accounts
+            chats = (
+                db.query(models.Chat)
+                .options(selectinload(models.Chat.messages))
+                .filter(models.Chat.user_id == current_user.id)
+                .order_by(models.Chat.updated_at.desc())
+                .all()
+            )
+            return [schemas.Chat.from_orm(chat) for chat in chats]
+        
+        return await run_db(load_chats)
     except Exception as e:
         logger.error(f"Error fetching chats: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -156,24 +251,71 @@ async def create_chat(chat_data: schemas.ChatCreate, current_user: models.User =
             title=chat_data.title,
             user_id=current_user.id
         )
-        db.add(new_chat)
-        db.commit()
-        db.refresh(new_chat)
-        return new_chat
+        
+        def save_chat():
+            db.add(new_chat)
+            db.commit()
+            db.refresh(new_chat)
+            return schemas.Chat.from_orm(new_chat)
+        
+        return await run_db(save_chat)
     except Exception as e:
         logger.error(f"Error creating chat: {str(e)}")
-        db.rollback()
+        await run_db(db.rollback)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/chats/summaries", response_model=schemas.ChatPage)
+async def get_chat_summaries(
+    limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    try:
+        def load_page():
+            chats, next_cursor = list_chat_summaries(db, current_user.id, limit, cursor)
+            return schemas.ChatPage(items=[schemas.ChatSummary.from_orm(chat) for chat in chats], next_cursor=next_cursor)
+        
+        return await run_db(load_page)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error fetching chat summaries: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/chats/{chat_id}/history", response_model=schemas.MessagePage)
+async def get_chat_history(
+    chat_id: int,
+    before_id: Optional[int] = None,
+    limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    try:
+        def load_page():
+            chat = db.query(models.Chat.id).filter(models.Chat.id == chat_id, models.Chat.user_id == current_user.id).first()
+            if not chat:
+                raise HTTPException(status_code=404, detail="Chat not found")
+            messages, next_before_id = list_messages(db, chat_id, before_id, limit)
+            return schemas.MessagePage(items=[schemas.Message.from_orm(m) for m in messages], next_before_id=next_before_id)
+        
+        return await run_db(load_page)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching chat history: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/chats/{chat_id}", response_model=schemas.Chat)
 async def get_chat(chat_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
     try:
-        from sqlalchemy.orm import joinedload
-        chat = db.query(models.Chat).options(joinedload(models.Chat.messages)).filter(models.Chat.id == chat_id, models.Chat.user_id == current_user.id).first()
-        if not chat:
-            raise HTTPException(status_code=404, detail="Chat not found")
-        db.refresh(chat)
-        return chat
+        def load_chat():
+            chat = db.query(models.Chat).options(selectinload(models.Chat.messages)).filter(models.Chat.id == chat_id, models.Chat.user_id == current_user.id).first()
+            if not chat:
+                raise HTTPException(status_code=404, detail="Chat not found")
+            return schemas.Chat.from_orm(chat)
+        
+        return await run_db(load_chat)
     except HTTPException:
         raise
     except Exception as e:
@@ -183,23 +325,27 @@ async def get_chat(chat_id: int, current_user: models.User = Depends(get_current
 @app.delete("/chats/{chat_id}")
 async def delete_chat(chat_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
     try:
-        chat = db.query(models.Chat).filter(models.Chat.id == chat_id, models.Chat.user_id == current_user.id).first()
-        if not chat:
-            raise HTTPException(status_code=404, detail="Chat not found")
-        
-        # Delete all messages in the chat
-        db.query(models.Message).filter(models.Message.chat_id == chat_id).delete()
+        def remove_chat():
+            chat = db.query(models.Chat).filter(models.Chat.id == chat_id, models.Chat.user_id == current_user.id).first()
+            if not chat:
+                raise HTTPException(status_code=404, detail="Chat not found")
+            
+            # Delete all messages in the chat
+            db.query(models.Message).filter(models.Message.chat_id == chat_id).delete()
+            
+            # Delete the chat
+            db.delete(chat)
+            db.commit()
         
-        # Delete the chat
-        db.delete(chat)
-        db.commit()
+        await run_db(remove_chat)
+        get_context_manager().invalidate(chat_id)
         
         return {"message": "Chat deleted successfully"}
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error deleting chat: {str(e)}")
-        db.rollback()
+        await run_db(db.rollback)
         raise HTTPException(status_code=500, detail=str(e))
 
 # Message routes with streaming
@@ -213,12 +359,44 @@ def options_chat_messages(chat_id: int):
         "Access-Control-Allow-Headers": "*"
     })
 
+def resolve_pdf_sources(db: Session, user_id: int, pdf_id: str) -> Tuple[Dict[str, str], List[Dict[str, str]]]:
+    """
+    Map the `pdf_id` query parameter to {index id: filename} for the user's PDFs.
+    Accepts one id, a comma-separated list of ids, or "all" for the PDFs behind the most
+    recent MAX_PDFS_PER_QUERY indexes that have not failed. Uploads of the same content
+    share an index. Also returns the PDFs "all" left out, as [{"id", "filename"}].
+    """
+    query = db.query(models.PDF).filter(models.PDF.user_id == user_id)
+    skipped = []
+    if pdf_id == "all":
+        pdfs = []
+        indexes = set()
+        for pdf in query.filter(models.PDF.processed != models.PDF_FAILED).order_by(models.PDF.created_at.desc()):
+            if pdf.index_id in indexes or len(indexes) < MAX_PDFS_PER_QUERY:
+                indexes.add(pdf.index_id)
+                pdfs.append(pdf)
+            else:
+                skipped.append({"id": pdf.id, "filename": pdf.filename})
+    else:
+        ids = list(dict.fromkeys(part.strip() for part in pdf_id.split(",") if part.strip()))
+        if len(ids) > MAX_PDFS_PER_QUERY:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_PDFS_PER_QUERY} PDFs can be queried at once")
+        pdfs = query.filter(models.PDF.id.in_(ids)).all()
+        if len(pdfs) != len(ids):
+            raise HTTPException(status_code=404, detail="PDF not found")
+    
+    sources = {}
+    for pdf in pdfs:
+        sources.setdefault(pdf.index_id, pdf.filename)
+    return sources, skipped
+
 @app.get("/chats/{chat_id}/messages", response_class=StreamingResponse)
 async def get_chat_messages(
     chat_id: int,
     message: str,
     pdf_id: Optional[str] = None,
     search: bool = False,
+    retrieval: Optional[str] = Query(None, pattern="^(vector|hybrid)$"),
     request: Request = None,
     token: str = Query(None),
     db: Session = Depends(get_db)
@@ -242,138 +420,157 @@ async def get_chat_messages(
         response.headers["Access-Control-Allow-Credentials"] = "true"
         return response
     try:
-        payload = jwt.decode(jwt_token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_email = payload.get("sub")
-        if user_email is None:
-            logger.error("Invalid token payload: no sub")
-            response = Response(
-                content=json.dumps({"detail": "Invalid token payload"}),
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                media_type="application/json"
-            )
-            response.headers["Access-Control-Allow-Origin"] = "*"
-            response.headers["Access-Control-Allow-Credentials"] = "true"
-            return response
-        current_user = db.query(models.User).filter(models.User.email == user_email).first()
-        if not current_user:
-            logger.error(f"User not found for email: {user_email}")
-            response = Response(
-                content=json.dumps({"detail": "User not found"}),
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                media_type="application/json"
-            )
-            response.headers["Access-Control-Allow-Origin"] = "*"
-            response.headers["Access-Control-Allow-Credentials"] = "true"
-            return response
-    except JWTError as e:
-        logger.error(f"JWT decode error: {str(e)}")
+        current_user = await resolve_token(jwt_token, db)
+    except HTTPException as e:
+        logger.error(f"SSE authentication failed: {e.detail}")
         response = Response(
-            content=json.dumps({"detail": "Invalid token"}),
-            status_code=status.HTTP_401_UNAUTHORIZED,
+            content=json.dumps({"detail": e.detail}),
+            status_code=e.status_code,
             media_type="application/json"
         )
         response.headers["Access-Control-Allow-Origin"] = "*"
         response.headers["Access-Control-Allow-Credentials"] = "true"
         return response
     try:
-        # Verify chat belongs to user
-        chat = db.query(models.Chat).filter(models.Chat.id == chat_id, models.Chat.user_id == current_user.id).first()
-        if not chat:
-            raise HTTPException(status_code=404, detail="Chat not found")
-        
-        # Create user message
-        user_message = models.Message(
-            chat_id=chat_id,
-            role="user",
-            content=message
-        )
-        db.add(user_message)
-        db.commit()
-        db.refresh(user_message)
-        
-        # Update chat title if it's the first message
-        if chat.title == "New Chat":
-            chat.title = message[:30] + ("..." if len(message) > 30 else "")
-            db.commit()
-        
-        # Create assistant message placeholder
-        assistant_message = models.Message(
-            chat_id=chat_id,
-            role="assistant",
-            content=""
-        )
-        db.add(assistant_message)
-        db.commit()
-        db.refresh(assistant_message)
-        
-        # Get chat history for context
-        history = db.query(models.Message).filter(
-            models.Message.chat_id == chat_id,
-            models.Message.id != assistant_message.id
-        ).order_by(models.Message.id).all()
+        def prepare_turn():
+            # Verify chat belongs to user
+            chat = db.query(models.Chat).filter(models.Chat.id == chat_id, models.Chat.user_id == current_user.id).first()
+            if not chat:
+                raise HTTPException(status_code=404, detail="Chat not found")
+            
+            # Resolve the PDFs to their (possibly shared) vector indexes
+            pdf_sources, skipped_pdfs = resolve_pdf_sources(db, current_user.id, pdf_id) if pdf_id else (None, [])
+            
+            # Create the user message, title and assistant placeholder in a single transaction
+            user_message = models.Message(
+                chat_id=chat_id,
+                role="user",
+                content=message
+            )
+            db.add(user_message)
+            
+            # Update chat title if it's the first message
+            if chat.title == "New Chat":
+                chat.title = message[:30] + ("..." if len(message) > 30 else "")
+            
+            # Create assistant message placeholder
+            assistant_message = models.Message(
+                chat_id=chat_id,
+                role="assistant",
+                content=""
+            )
+            db.add(assistant_message)
+            db.flush()
+            assistant_id = assistant_message.id
+            
+            # Get the token-budgeted chat history for context
+            try:
+                formatted_history = get_context_manager().load_history(db, chat_id, assistant_id)
+                db.commit()
+            except Exception:
+                # The cached context may already include the uncommitted user message
+                get_context_manager().invalidate(chat_id)
+                raise
+            
+            # Release the session and its connection before streaming starts
+            db.close()
+            return assistant_id, formatted_history, pdf_sources, skipped_pdfs
         
-        # Format history for AI
-        formatted_history = [{"role": msg.role, "content": msg.content} for msg in history]
+        assistant_id, formatted_history, pdf_sources, skipped_pdfs = await run_db(prepare_turn)
         
         # Define the streaming response function
         async def stream_response():
+            full_response = ""
+            ticket = None
+            upstream = None
+            completed = False
+            SSE_ACTIVE_STREAMS.inc()
             try:
-                # Search the web if requested
-                search_results = None
-                if search:
-                    try:
-                        search_results = await search_web(message)
-                        # Send search results to client
-                        yield f"data: {json.dumps({'type': 'search_results', 'results': search_results})}\n\n"
-                    except Exception as e:
-                        logger.error(f"Web search error: {str(e)}")
-                        search_results = None
+                # Search the web and query the PDFs concurrently, each with its own deadline
+                search_results, pdf_context, timings = await retrieve_context(
+                    message, pdf_sources=pdf_sources, search=search, retrieval=retrieval
+                )
+                
+                if search_results is not None:
+                    # Send search results to client
+                    yield f"data: {json.dumps({'type': 'search_results', 'results': search_results})}\n\n"
                 
-                # Query PDF if provided
-                pdf_context = None
-                if pdf_id:
-                    try:
-                        pdf_context = await query_pdf(pdf_id, message)
-                    except Exception as e:
-                        logger.error(f"PDF query error: {str(e)}")
-                        pdf_context = None
+                # Send per-stage retrieval timings to client, with any PDFs left out of pdf_id=all
+                event = {'type': 'timings', 'stages': timings}
+                if skipped_pdfs:
+                    event['skipped_pdfs'] = skipped_pdfs
+                yield f"data: {json.dumps(event)}\n\n"
                 
-                # Generate AI response
-                full_response = ""
-                async for chunk in generate_response(
+                # Wait for an upstream slot, telling the client its place in the queue
+                ticket = get_admission_controller().enqueue(current_user.id)
+                position = None
+                while not ticket.admitted:
+                    if time.monotonic() - ticket.enqueued_at > ADMISSION_MAX_WAIT:
+                        raise AdmissionRejected("Timed out waiting for a free slot; please try again shortly")
+                    if ticket.position != position:
+                        position = ticket.position
+                        yield f"data: {json.dumps({'type': 'queue', 'position': position})}\n\n"
+                    await ticket.wait_for_change(ADMISSION_POSITION_INTERVAL)
+                
+                # Generate AI response, checkpointing partial content in the background
+                checkpointer = StreamCheckpointer(get_message_writer(), assistant_id)
+                upstream = generate_cached_response(
                     message, 
                     formatted_history, 
                     search_results=search_results,
                     pdf_context=pdf_context
-                ):
+                )
+                async for chunk in upstream:
                     full_response += chunk
+                    checkpointer.update(full_response)
                     # Send chunk to client
                     yield f"data: {json.dumps({'type': 'content', 'content': chunk})}\n\n"
                     await asyncio.sleep(0.01)  # Small delay for natural typing effect
                 
-                # Update assistant message in database
-                assistant_message.content = full_response
-                db.commit()
+                # Write the complete assistant message
+                await checkpointer.finish(full_response)
+                completed = True
+                record_completed_stream()
+                get_context_manager().record(chat_id, assistant_id, "assistant", full_response)
                 
                 # Send end event
                 yield f"data: {json.dumps({'type': 'end'})}\n\n"
                 
+            except (asyncio.CancelledError, GeneratorExit):
+                # The client disconnected, during retrieval, the admission wait or the reply itself:
+                # stop generating and keep what was produced so far.
+                # Nothing here may await, since the surrounding task is being cancelled.
+                if completed:
+                    raise
+                logger.info(f"Client disconnected from chat {chat_id}; cancelling reply {assistant_id}")
+                cancel_upstream(upstream, full_response)
+                get_message_writer().update(assistant_id, content=full_response, truncated=True)
+                raise
             except Exception as e:
                 logger.error(f"Streaming error: {str(e)}")
                 yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
                 logger.error(f"Message processing error: {str(e)}")
-                assistant_message.content = f"I'm sorry, an error occurred: {str(e)}"
-                db.commit()
+                try:
+                    await get_message_writer().update_and_wait(assistant_id, content=f"I'm sorry, an error occurred: {str(e)}")
+                except Exception as write_error:
+                    logger.error(f"Error saving failed reply {assistant_id}: {str(write_error)}")
                 # Do not return a Response here; just let the generator end.
+            finally:
+                # Free the upstream slot, or leave the queue, even if the client disconnected
+                if ticket is not None:
+                    ticket.release()
+                SSE_ACTIVE_STREAMS.dec()
         
         response = StreamingResponse(stream_response(), media_type="text/event-stream")
         response.headers["Access-Control-Allow-Origin"] = "*"
         response.headers["Access-Control-Allow-Credentials"] = "true"
         return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Message processing error: {str(e)}")
-        db.rollback()
+        await run_db(db.rollback)
         raise HTTPException(status_code=500, detail=str(e))
 
 # PDF routes
@@ -394,23 +591,44 @@ async def upload_pdf(
         # Create file path
         file_path = os.path.join(UPLOAD_DIR, f"{pdf_id}.pdf")
         
-        # Save the file
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # Stream the file to disk with a size limit, checking the PDF header and hashing it as it arrives
+        content_hash = await save_upload(file, file_path)
         
-        # Create PDF record in database
-        pdf_record = models.PDF(
-            id=pdf_id,
-            filename=file.filename,
-            path=file_path,
-            user_id=current_user.id
-        )
-        db.add(pdf_record)
-        db.commit()
+        def save_pdf():
+            # Identical content already uploaded (by anyone) shares its text and embedding index
+            existing = db.query(models.PDF).filter(
+                models.PDF.content_hash == content_hash,
+                models.PDF.processed != models.PDF_FAILED
+            ).order_by(models.PDF.created_at).first()
+            
+            # Create PDF ownership record in database
+            pdf_record = models.PDF(
+                id=pdf_id,
+                filename=file.filename,
+                path=existing.path if existing else file_path,
+                content_hash=content_hash,
+                user_id=current_user.id
+            )
+            if existing:
+                pdf_record.processed = existing.processed
+                pdf_record.page_count = existing.page_count
+                pdf_record.pages_processed = existing.pages_processed
+                pdf_record.chunks_indexed = existing.chunks_indexed
+            db.add(pdf_record)
+            db.commit()
+            return existing
+        
+        existing = await run_db(save_pdf)
+        
+        if existing:
+            # Drop the duplicate copy; the record points at the original file
+            await asyncio.to_thread(os.remove, file_path)
+            logger.info(f"PDF {pdf_id} reuses the index of identical upload {existing.id}")
+            pdf_status = "processed" if existing.processed == models.PDF_PROCESSED else "processing"
+            return {"id": pdf_id, "filename": file.filename, "status": pdf_status}
         
         # Process PDF in background
-        background_tasks.add_task(process_pdf, pdf_id, file_path)
+        background_tasks.add_task(process_pdf, pdf_id, file_path, content_hash)
         
         return {"id": pdf_id, "filename": file.filename, "status": "processing"}
         
@@ -419,7 +637,28 @@ async def upload_pdf(
     except Exception as e:
         logger.error(f"PDF upload error: {str(e)}")
         if 'db' in locals() and db:
-            db.rollback()
+            await run_db(db.rollback)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/pdfs/{pdf_id}", response_model=schemas.PDFStatus)
+async def get_pdf_status(pdf_id: str, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    try:
+        pdf = await run_db(lambda: db.query(models.PDF).filter(models.PDF.id == pdf_id, models.PDF.user_id == current_user.id).first())
+        if not pdf:
+            raise HTTPException(status_code=404, detail="PDF not found")
+        
+        return {
+            "id": pdf.id,
+            "filename": pdf.filename,
+            "status": models.PDF_STATUS_NAMES.get(pdf.processed or 0, "pending"),
+            "page_count": pdf.page_count or 0,
+            "pages_processed": pdf.pages_processed or 0,
+            "chunks_indexed": pdf.chunks_indexed or 0
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching PDF status: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
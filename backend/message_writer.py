@@ -0,0 +1,188 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+import models
+from database import SessionLocal, run_db
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# How often pending message updates are written, and how many trigger an early write
+MESSAGE_FLUSH_INTERVAL = float(os.getenv("MESSAGE_FLUSH_INTERVAL", "0.5"))
+MESSAGE_FLUSH_MAX_BATCH = int(os.getenv("MESSAGE_FLUSH_MAX_BATCH", "200"))
+
+# A streaming reply is checkpointed after this many seconds or new characters, whichever comes first
+STREAM_CHECKPOINT_INTERVAL = float(os.getenv("STREAM_CHECKPOINT_INTERVAL", "2.0"))
+STREAM_CHECKPOINT_CHARS = int(os.getenv("STREAM_CHECKPOINT_CHARS", "2000"))
+
+
+def _write_batch(batch: Dict[int, Dict[str, Any]]) -> None:
+    db = SessionLocal()
+    try:
+        db.bulk_update_mappings(models.Message, [{"id": message_id, **values} for message_id, values in batch.items()])
+        db.commit()
+    finally:
+        db.close()
+
+
+class MessageWriter:
+    """
+    Write-behind buffer for message updates. Updates to the same message are coalesced,
+    and all pending updates are written in one transaction per flush, so the number of
+    writes depends on the flush interval rather than on how many tokens are streamed.
+    """
+
+    def __init__(self, flush_interval: float = MESSAGE_FLUSH_INTERVAL, max_batch: int = MESSAGE_FLUSH_MAX_BATCH):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        # Resolved once the pending batch is written; only created when someone waits for it
+        self._batch_written: Optional[asyncio.Future] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.updates = 0
+        self.coalesced = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.errors = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the background task and write whatever is still pending.
+        """
+        if self._task is not None:
+            # Let an in-progress flush complete rather than cancelling it
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def update(self, message_id: int, **values) -> None:
+        """
+        Queue column values for a message; returns immediately.
+        """
+        self.start()
+        self.updates += 1
+        if message_id in self._pending:
+            self.coalesced += 1
+            self._pending[message_id].update(values)
+        else:
+            self._pending[message_id] = dict(values)
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    async def update_and_wait(self, message_id: int, **values) -> None:
+        """
+        Queue column values for a message and wait until they are written.
+        """
+        self.update(message_id, **values)
+        if self._batch_written is None:
+            self._batch_written = asyncio.get_running_loop().create_future()
+        written = self._batch_written
+        self._wakeup.set()
+        await asyncio.shield(written)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        batch, self._pending = self._pending, {}
+        written, self._batch_written = self._batch_written, None
+        if not batch:
+            if written is not None:
+                written.set_result(None)
+            return
+
+        try:
+            await run_db(_write_batch, batch)
+            self.flushes += 1
+            self.rows_written += len(batch)
+            if written is not None:
+                written.set_result(None)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error writing {len(batch)} message updates: {str(e)}")
+            # Keep the values for the next flush unless newer ones were queued meanwhile
+            for message_id, values in batch.items():
+                self._pending[message_id] = {**values, **self._pending.get(message_id, {})}
+            if written is not None:
+                written.set_exception(e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "updates": self.updates,
+            "coalesced": self.coalesced,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "errors": self.errors,
+        }
+
+
+class StreamCheckpointer:
+    """
+    Checkpoints the partial content of one streaming reply through the message writer.
+    """
+
+    def __init__(
+        self,
+        writer: MessageWriter,
+        message_id: int,
+        interval: float = STREAM_CHECKPOINT_INTERVAL,
+        max_chars: int = STREAM_CHECKPOINT_CHARS
+    ):
+        self.writer = writer
+        self.message_id = message_id
+        self.interval = interval
+        self.max_chars = max_chars
+        self._last_time = time.monotonic()
+        self._last_length = 0
+
+    def update(self, content: str) -> None:
+        now = time.monotonic()
+        if now - self._last_time >= self.interval or len(content) - self._last_length >= self.max_chars:
+            self.writer.update(self.message_id, content=content)
+            self._last_time = now
+            self._last_length = len(content)
+
+    async def finish(self, content: str, **values) -> None:
+        """
+        Write the final content and wait until it is durable.
+        """
+        await self.writer.update_and_wait(self.message_id, content=content, **values)
+
+
+_message_writer = None
+
+
+def get_message_writer() -> MessageWriter:
+    """
+    Get or create the shared message writer.
+    """
+    global _message_writer
+    if _message_writer is None:
+        _message_writer = MessageWriter()
+    return _message_writer
+
+
+async def stop_message_writer() -> None:
+    global _message_writer
+    if _message_writer is not None:
+        await _message_writer.stop()
+        _message_writer = None
@@ -0,0 +1,248 @@
+import os
+import time
+import logging
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Export spans over OTLP (endpoint from OTEL_EXPORTER_OTLP_ENDPOINT) in addition to /metrics
+OTEL_TRACING_ENABLED = os.getenv("OTEL_TRACING_ENABLED", "false").lower() == "true"
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "chatbot-backend")
+# Longest shutdown waits for buffered spans to be exported, in milliseconds
+OTEL_FLUSH_TIMEOUT_MS = int(os.getenv("OTEL_FLUSH_TIMEOUT_MS", "5000"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_registry: List["_Metric"] = []
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """
+    Base for metrics with optional labels. Updates take no locks: on the event loop they
+    cannot interleave, and from worker threads the GIL makes a lost increment rare enough
+    not to matter for monitoring.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        super().__init__(name, description, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> Iterator[str]:
+        for key, value in list(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labels, key)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+        # Per label set: [count per bucket (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def _samples(self) -> Iterator[str]:
+        for key, (counts, total) in list(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labels, key, f'le="{le}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}"
+
+
+def render_metrics() -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+# Hot-stage metrics
+HTTP_REQUEST_SECONDS = Histogram("http_request_seconds", "HTTP request duration, including streaming", ["method", "route", "status"])
+DB_CALL_SECONDS = Histogram("db_call_seconds", "Time spent in database work per route, including pool queueing", ["route"])
+SSE_ACTIVE_STREAMS = Gauge("sse_active_streams", "Chat streams currently open")
+LLM_TIME_TO_FIRST_TOKEN_SECONDS = Histogram("llm_time_to_first_token_seconds", "Time from request to first generated token")
+LLM_TOKENS_PER_SECOND = Histogram("llm_tokens_per_second", "Generation speed after the first token (one streamed delta counted as one token)", buckets=RATE_BUCKETS)
+LLM_TOKENS = Counter("llm_tokens_total", "Streamed deltas received from the LLM")
+TAVILY_SECONDS = Histogram("tavily_request_seconds", "Tavily search latency", ["outcome"])
+VECTOR_STORE_SECONDS = Histogram("vector_store_seconds", "Chroma call latency", ["operation"])
+EMBEDDING_SECONDS = Histogram("embedding_seconds", "Embedding model inference latency per batch")
+EMBEDDING_TEXTS = Counter("embedding_texts_total", "Texts embedded")
+INGESTION_PAGES = Counter("ingestion_pages_total", "PDF pages ingested")
+INGESTION_PAGES_PER_SECOND = Histogram("ingestion_pages_per_second", "Ingestion throughput per document", buckets=RATE_BUCKETS)
+
+
+# The ASGI scope of the current request; the router adds the matched route to it
+_current_scope: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("current_scope", default=None)
+
+
+def _route_of(scope: Optional[dict]) -> str:
+    route = scope.get("route") if scope else None
+    return getattr(route, "path", "unmatched") if scope else "background"
+
+
+def current_route() -> str:
+    """
+    Path template of the route handling the current request, or "background" outside requests.
+    """
+    return _route_of(_current_scope.get())
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request duration per route template, without buffering responses.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _current_scope.set(scope)
+        started = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started, method=scope["method"], route=_route_of(scope), status=status["code"]
+            )
+            _current_scope.reset(token)
+
+
+# Optional OpenTelemetry tracing
+_tracer = None
+_tracer_provider = None
+
+
+def init_tracing(app) -> None:
+    """
+    Export request and stage spans over OTLP when OTEL_TRACING_ENABLED is set and the packages are installed.
+    """
+    global _tracer, _tracer_provider
+    if not OTEL_TRACING_ENABLED:
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError as e:
+        logger.error(f"OpenTelemetry tracing requested but unavailable: {str(e)}")
+        return
+
+    # Flushed with a deadline in shutdown_tracing; the default exit hook retries an unreachable collector for a minute
+    _tracer_provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}), shutdown_on_exit=False)
+    _tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(_tracer_provider)
+    _tracer = trace.get_tracer(__name__)
+    FastAPIInstrumentor.instrument_app(app)
+    logger.info("OpenTelemetry tracing enabled")
+
+
+def shutdown_tracing() -> None:
+    global _tracer, _tracer_provider
+    if _tracer_provider is not None:
+        _tracer_provider.force_flush(timeout_millis=OTEL_FLUSH_TIMEOUT_MS)
+        _tracer_provider = None
+        _tracer = None
+
+
+def start_span(name: str, **attributes):
+    """
+    Start a span without making it current (safe across yields in generators); None when tracing is off.
+    """
+    if _tracer is None:
+        return None
+    return _tracer.start_span(name, attributes=attributes)
+
+
+def end_span(span, **attributes) -> None:
+    if span is not None:
+        span.set_attributes(attributes)
+        span.end()
+
+
+@contextmanager
+def timed(histogram: Histogram, span_name: Optional[str] = None, **labels) -> Iterator[None]:
+    """
+    Observe the duration of the block in `histogram`, and record it as a span when tracing is on.
+    """
+    span = start_span(span_name, **labels) if span_name else None
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, **labels)
+        end_span(span)
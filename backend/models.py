@@ -1,8 +1,16 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, JSON, Index, Boolean
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
 
+# SQLite's CURRENT_TIMESTAMP has second precision; storing Python datetimes the same way keeps
+# stored values and bound parameters directly comparable, which keyset pagination relies on
+Timestamp = DateTime(timezone=True).with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    "sqlite"
+)
+
 class User(Base):
     __tablename__ = "users"
     
@@ -22,10 +30,15 @@ class Chat(Base):
     title = Column(String)
     user_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    updated_at = Column(Timestamp, server_default=func.now(), onupdate=func.now())
     
     user = relationship("User", back_populates="chats")
-    messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan")
+    messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan", order_by="Message.id")
+    
+    __table_args__ = (
+        # Chat list: WHERE user_id = ? ORDER BY updated_at DESC, id DESC
+        Index("ix_chats_user_id_updated_at_id", "user_id", "updated_at", "id"),
+    )
 
 class Message(Base):
     __tablename__ = "messages"
@@ -34,9 +47,37 @@ class Message(Base):
     chat_id = Column(Integer, ForeignKey("chats.id"))
     role = Column(String)  # "user", "assistant", or "system"
     content = Column(Text)
+    truncated = Column(Boolean, default=False)  # reply cut short because the client disconnected
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     chat = relationship("Chat", back_populates="messages")
+    
+    __table_args__ = (
+        # History pages: WHERE chat_id = ? AND id < ? ORDER BY id DESC
+        Index("ix_messages_chat_id_id", "chat_id", "id"),
+    )
+
+# PDF processing states stored in PDF.processed
+PDF_PENDING = 0
+PDF_PROCESSING = 1
+PDF_PROCESSED = 2
+PDF_FAILED = 3
+
+# Length of the content hash prefix used to name shared vector indexes
+INDEX_HASH_LENGTH = 40
+
+def pdf_index_id(pdf_id: str, content_hash: str = None) -> str:
+    """
+    Vector index key for a PDF. Uploads with identical content share one index.
+    """
+    return content_hash[:INDEX_HASH_LENGTH] if content_hash else pdf_id
+
+PDF_STATUS_NAMES = {
+    PDF_PENDING: "pending",
+    PDF_PROCESSING: "processing",
+    PDF_PROCESSED: "processed",
+    PDF_FAILED: "failed",
+}
 
 class PDF(Base):
     __tablename__ = "pdfs"
@@ -44,8 +85,21 @@ class PDF(Base):
     id = Column(String, primary_key=True)
     filename = Column(String)
     path = Column(String)
+    content_hash = Column(String, index=True)  # SHA-256 of the file; identical uploads share one index
     user_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    processed = Column(Integer, default=0)  # 0: not processed, 1: processing, 2: processed
+    processed = Column(Integer, default=0)  # 0: not processed, 1: processing, 2: processed, 3: failed
+    page_count = Column(Integer, default=0)
+    pages_processed = Column(Integer, default=0)
+    chunks_indexed = Column(Integer, default=0)
     
     user = relationship("User", back_populates="pdfs")
+    
+    __table_args__ = (
+        # Ownership checks and "all my PDFs": WHERE user_id = ? ORDER BY created_at DESC
+        Index("ix_pdfs_user_id_created_at", "user_id", "created_at"),
+    )
+    
+    @property
+    def index_id(self) -> str:
+        return pdf_index_id(self.id, self.content_hash)
@@ -0,0 +1,31 @@
+"""
+PDF text extraction helpers that run inside the ingestion process pool.
+
+This module is imported by every worker process, so it must stay free of
+heavy imports (database, vector store, web framework).
+"""
+from typing import List, Tuple
+
+
+def count_pages(file_path: str) -> int:
+    """
+    Return the number of pages in a PDF file.
+    """
+    import PyPDF2
+
+    with open(file_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def extract_pages(file_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """
+    Extract the text of pages [start, end) as (page_number, text) pairs.
+    """
+    import PyPDF2
+
+    pages = []
+    with open(file_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for page_num in range(start, min(end, len(reader.pages))):
+            pages.append((page_num, reader.pages[page_num].extract_text() or ""))
+    return pages
@@ -0,0 +1,125 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import text
+
+from database import engine, migrate_schema, run_db
+from embeddings import get_embedding_engine
+from chunking import refresh_chunk_tokenizer
+from tokens import refresh_tokenizer
+from vector_db import get_chroma_client
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Components /readyz waits for
+COMPONENTS = ("database", "vector_store", "embedding_model")
+# Failed warm-up steps are retried this often, in seconds
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "30"))
+# Longest a readiness probe waits for the database to answer, in seconds
+READINESS_DB_TIMEOUT = float(os.getenv("READINESS_DB_TIMEOUT", "2"))
+
+
+def _ping_database() -> None:
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+
+def _warm_up_embeddings() -> None:
+    get_embedding_engine().warmup()
+    # The token counter and chunker use the model's tokenizer, which the warm-up may just have downloaded;
+    # requests served before that fell back to estimates, so load it now
+    refresh_tokenizer()
+    refresh_chunk_tokenizer()
+
+
+class Readiness:
+    """
+    Tracks which subsystems have finished starting up. The database schema is prepared
+    before the server starts listening; the vector store and embedding model warm up in
+    the background afterwards, and /readyz reports ready once all of them are.
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.components: Dict[str, Dict[str, Any]] = {
+            name: {"ready": False, "seconds": None, "error": None} for name in COMPONENTS
+        }
+        self._task: Optional[asyncio.Task] = None
+
+    async def _step(self, name: str, fn) -> bool:
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(fn)
+        except Exception as e:
+            self.components[name]["error"] = str(e)
+            logger.error(f"Warm-up of {name} failed: {str(e)}")
+            return False
+        self.components[name].update(ready=True, seconds=round(time.perf_counter() - started, 3), error=None)
+        logger.info(f"{name} ready in {self.components[name]['seconds']}s")
+        return True
+
+    async def prepare_database(self) -> None:
+        """
+        Create or migrate the schema. Raises if that fails, since no route can work without it.
+        """
+        if not await self._step("database", migrate_schema):
+            raise RuntimeError(f"Database migration failed: {self.components['database']['error']}")
+
+    def start_warmup(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._warm_up())
+
+    async def _warm_up(self) -> None:
+        steps = {"vector_store": get_chroma_client, "embedding_model": _warm_up_embeddings}
+        while True:
+            for name, fn in steps.items():
+                if not self.components[name]["ready"]:
+                    await self._step(name, fn)
+            if all(self.components[name]["ready"] for name in steps):
+                return
+            await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def check(self) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Report readiness, checking on every call that the database still answers.
+        """
+        components = {name: dict(status) for name, status in self.components.items()}
+        database = components["database"]
+        if database["ready"]:
+            try:
+                await asyncio.wait_for(run_db(_ping_database), timeout=READINESS_DB_TIMEOUT)
+            except Exception as e:
+                database.update(ready=False, error=str(e) or type(e).__name__)
+
+        ready = all(status["ready"] for status in components.values())
+        return ready, {
+            "ready": ready,
+            "uptime_seconds": round(time.monotonic() - self.started_at, 1),
+            "components": components,
+        }
+
+
+_readiness = None
+
+
+def get_readiness() -> Readiness:
+    """
+    Get or create the shared readiness state.
+    """
+    global _readiness
+    if _readiness is None:
+        _readiness = Readiness()
+    return _readiness
@@ -35,9 +35,9 @@ class Message(MessageBase):
     id: int
     chat_id: int
     created_at: datetime
-    
-    class Config:
-        orm_mode = True
+    truncated: Optional[bool] = False
+
+    model_config = {"from_attributes": True}
 
 # Chat schemas
 class ChatBase(BaseModel):
@@ -52,12 +52,35 @@ class Chat(ChatBase):
     created_at: datetime
     updated_at: datetime
     messages: List[Message] = []
-    
-    class Config:
-        orm_mode = True
+
+    model_config = {"from_attributes": True}
+
+class ChatSummary(ChatBase):
+    id: int
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = {"from_attributes": True}
+
+class ChatPage(BaseModel):
+    items: List[ChatSummary]
+    next_cursor: Optional[str] = None
+
+class MessagePage(BaseModel):
+    items: List[Message]
+    # Pass as before_id to fetch the previous (older) page
+    next_before_id: Optional[int] = None
 
 # PDF schemas
 class PDFResponse(BaseModel):
     id: str
     filename: str
     status: str
+
+class PDFStatus(BaseModel):
+    id: str
+    filename: str
+    status: str
+    page_count: int
+    pages_processed: int
+    chunks_indexed: int
@@ -0,0 +1,168 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Callable, Awaitable
+
+from cachetools import TTLCache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Web search cache configuration
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1000"))
+# Optional SQLite file that lets cached results survive restarts
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH")
+
+SearchResults = List[Dict[str, str]]
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a search query so that case and spacing differences share a cache entry.
+    """
+    return " ".join(query.lower().split()).strip("?!. ")
+
+
+class DiskSearchStore:
+    """
+    Persistent search result store backed by a local SQLite file.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache (query TEXT PRIMARY KEY, results TEXT NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, ttl: float) -> Optional[SearchResults]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, stored_at FROM search_cache WHERE query = ?", (key,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > ttl:
+            return None
+        return json.loads(row[0])
+
+    def put(self, key: str, results: SearchResults) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (query, results, stored_at) VALUES (?, ?, ?)",
+                (key, json.dumps(results), time.time())
+            )
+            # Keep the file bounded by dropping the oldest rows
+            self._conn.execute(
+                "DELETE FROM search_cache WHERE query NOT IN "
+                "(SELECT query FROM search_cache ORDER BY stored_at DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SearchCache:
+    """
+    TTL cache for web search results that also merges concurrent identical searches
+    into a single upstream request.
+    """
+
+    def __init__(
+        self,
+        ttl: float = SEARCH_CACHE_TTL,
+        max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+        path: Optional[str] = SEARCH_CACHE_PATH
+    ):
+        self.ttl = ttl
+        self._memory = TTLCache(maxsize=max_entries, ttl=ttl)
+        self._disk = DiskSearchStore(path, max_entries) if path else None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def _load(self, key: str, query: str, fetch: Callable[[str], Awaitable[SearchResults]]) -> SearchResults:
+        try:
+            if self._disk is not None:
+                results = await asyncio.to_thread(self._disk.get, key, self.ttl)
+                if results is not None:
+                    self.disk_hits += 1
+                    self._memory[key] = results
+                    return results
+
+            self.misses += 1
+            results = await fetch(query)
+            # Empty results usually mean an upstream problem; do not pin them in the cache
+            if results:
+                self._memory[key] = results
+                if self._disk is not None:
+                    await asyncio.to_thread(self._disk.put, key, results)
+            return results
+        finally:
+            self._inflight.pop(key, None)
+
+    async def get_or_fetch(self, query: str, fetch: Callable[[str], Awaitable[SearchResults]]) -> SearchResults:
+        """
+        Return cached results for the query, or fetch them once for all concurrent callers.
+        """
+        key = normalize_query(query)
+        results = self._memory.get(key)
+        if results is not None:
+            self.hits += 1
+            return results
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            # The shared fetch runs in its own task so a cancelled caller does not cancel it for the others
+            task = self._inflight[key] = asyncio.ensure_future(self._load(key, query, fetch))
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
+            "persistent": self._disk is not None,
+        }
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+
+
+_search_cache = None
+
+
+def get_search_cache() -> SearchCache:
+    """
+    Get or create the shared search cache.
+    """
+    global _search_cache
+    if _search_cache is None:
+        _search_cache = SearchCache()
+    return _search_cache
+
+
+def close_search_cache() -> None:
+    global _search_cache
+    if _search_cache is not None:
+        _search_cache.close()
+        _search_cache = None
@@ -0,0 +1,171 @@
+import os
+import re
+import time
+import json
+import hashlib
+import logging
+import itertools
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from embedding_batcher import get_embedding_batcher
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Semantic response cache configuration
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalize a prompt so that trivial differences in case, spacing and trailing punctuation match.
+    """
+    text = " ".join(prompt.lower().split())
+    return text.rstrip("?!. ")
+
+
+def context_fingerprint(
+    history: List[Dict[str, str]],
+    search_results: Optional[List[Dict[str, str]]] = None,
+    pdf_context: Optional[str] = None
+) -> str:
+    """
+    Hash everything besides the prompt that shapes the answer.
+    Only answers generated with an identical context can be reused.
+    """
+    payload = json.dumps(
+        {"history": history, "search": search_results or [], "pdf": pdf_context or ""},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    embedding: np.ndarray
+    fingerprint: str
+    answer: str
+    created_at: float
+
+
+class SemanticCache:
+    """
+    Size-bounded LRU cache of model answers, looked up by cosine similarity of prompt embeddings.
+    """
+
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl: float = SEMANTIC_CACHE_TTL,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._by_fingerprint: Dict[str, set] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    async def embed(self, prompt: str) -> np.ndarray:
+        vectors = await get_embedding_batcher().embed([normalize_prompt(prompt)])
+        vector = np.asarray(vectors[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        ids = self._by_fingerprint.get(entry.fingerprint)
+        if ids is not None:
+            ids.discard(entry_id)
+            if not ids:
+                del self._by_fingerprint[entry.fingerprint]
+
+    def lookup(self, embedding: np.ndarray, fingerprint: str) -> Optional[str]:
+        """
+        Return the cached answer most similar to the embedding, if it clears the threshold.
+        """
+        now = time.time()
+        with self._lock:
+            candidates = []
+            for entry_id in list(self._by_fingerprint.get(fingerprint, ())):
+                entry = self._entries[entry_id]
+                if now - entry.created_at > self.ttl:
+                    self._remove(entry_id)
+                    self.expirations += 1
+                else:
+                    candidates.append(entry_id)
+
+            if candidates:
+                matrix = np.stack([self._entries[entry_id].embedding for entry_id in candidates])
+                scores = matrix @ embedding
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    entry_id = candidates[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return self._entries[entry_id].answer
+
+            self.misses += 1
+            return None
+
+    def store(self, embedding: np.ndarray, fingerprint: str, answer: str) -> None:
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = CacheEntry(embedding, fingerprint, answer, time.time())
+            self._by_fingerprint.setdefault(fingerprint, set()).add(entry_id)
+            self.stores += 1
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "threshold": self.threshold,
+        }
+
+
+def split_for_replay(answer: str, words_per_chunk: int = 3) -> List[str]:
+    """
+    Split a cached answer into small chunks so it streams like a live generation.
+    """
+    words = re.findall(r"\s*\S+\s*", answer)
+    return ["".join(words[i:i + words_per_chunk]) for i in range(0, len(words), words_per_chunk)]
+
+
+_semantic_cache = None
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """
+    Get the shared semantic cache, or None if it is disabled.
+    """
+    global _semantic_cache
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    if _semantic_cache is None:
+        _semantic_cache = SemanticCache()
+    return _semantic_cache
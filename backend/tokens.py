@@ -0,0 +1,84 @@
+import os
+import logging
+import threading
+from pathlib import Path
+from typing import Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Tokenizer used for token budgeting. TOKENIZER_PATH points to a tokenizer.json file,
+# TOKENIZER_NAME to a Hugging Face Hub repository (downloaded on first use).
+TOKENIZER_PATH = os.getenv("TOKENIZER_PATH")
+TOKENIZER_NAME = os.getenv("TOKENIZER_NAME")
+
+# The embedding model cache already contains a tokenizer.json we can fall back to
+CHROMA_TOKENIZER_PATH = Path.home() / ".cache" / "chroma" / "onnx_models" / "all-MiniLM-L6-v2" / "onnx" / "tokenizer.json"
+
+# Rough estimate used when no tokenizer can be loaded: 1 token ~= 4 characters
+CHARS_PER_TOKEN = 4
+
+_tokenizer = None
+_tokenizer_loaded = False
+_tokenizer_lock = threading.Lock()
+
+
+def _load_tokenizer():
+    from tokenizers import Tokenizer
+
+    if TOKENIZER_PATH:
+        tokenizer = Tokenizer.from_file(TOKENIZER_PATH)
+    elif TOKENIZER_NAME:
+        tokenizer = Tokenizer.from_pretrained(TOKENIZER_NAME)
+    elif CHROMA_TOKENIZER_PATH.exists():
+        tokenizer = Tokenizer.from_file(str(CHROMA_TOKENIZER_PATH))
+    else:
+        return None
+
+    # We only count tokens, so never truncate or pad
+    tokenizer.no_truncation()
+    tokenizer.no_padding()
+    return tokenizer
+
+
+def get_tokenizer():
+    """
+    Get the shared tokenizer, or None if no tokenizer is available.
+    """
+    global _tokenizer, _tokenizer_loaded
+    if not _tokenizer_loaded:
+        with _tokenizer_lock:
+            if not _tokenizer_loaded:
+                try:
+                    _tokenizer = _load_tokenizer()
+                    if _tokenizer is None:
+                        logger.warning("No tokenizer configured. Falling back to character-based token estimates.")
+                except Exception as e:
+                    logger.error(f"Error loading tokenizer: {str(e)}")
+                    _tokenizer = None
+                _tokenizer_loaded = True
+    return _tokenizer
+
+
+def refresh_tokenizer():
+    """
+    Retry loading the tokenizer if earlier calls found none, e.g. because they ran before the
+    embedding model (and its tokenizer) had been downloaded.
+    """
+    global _tokenizer_loaded
+    with _tokenizer_lock:
+        if _tokenizer is None:
+            _tokenizer_loaded = False
+    return get_tokenizer()
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """
+    Count the tokens in a piece of text.
+    """
+    if not text:
+        return 0
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return max(1, len(text) // CHARS_PER_TOKEN)
+    return len(tokenizer.encode(text, add_special_tokens=False).ids)
@@ -0,0 +1,163 @@
+import os
+import asyncio
+import hashlib
+import logging
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Bytes read from the upload per iteration; bounds memory per concurrent upload
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+# Largest accepted upload in bytes
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+
+# Multipart framing (boundary lines, part headers) allowed on top of MAX_UPLOAD_BYTES
+MULTIPART_OVERHEAD = 64 * 1024
+# Leading body bytes searched for the file part's PDF header while the upload arrives
+UPLOAD_SNIFF_WINDOW = 64 * 1024
+
+# Every PDF starts with this marker within its first 1024 bytes
+PDF_MAGIC = b"%PDF-"
+PDF_HEADER_WINDOW = 1024
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _write_chunk(f, sha256, chunk: bytes) -> None:
+    # hashlib releases the GIL for large buffers, so hashing runs off the event loop too
+    sha256.update(chunk)
+    f.write(chunk)
+
+
+def _finish(f, temp_path: str, file_path: str) -> None:
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+    os.replace(temp_path, file_path)
+
+
+async def save_upload(file: UploadFile, file_path: str, max_bytes: int = MAX_UPLOAD_BYTES) -> str:
+    """
+    Stream an upload to disk in fixed-size chunks and return the SHA-256 of its content.
+    Rejects uploads larger than `max_bytes` (413) or without a PDF header (400).
+    The file only appears at `file_path` once it has been fully written and fsynced.
+    """
+    temp_path = f"{file_path}.part"
+    sha256 = hashlib.sha256()
+    size = 0
+    head = b""
+    f = await asyncio.to_thread(open, temp_path, "wb")
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+
+            size += len(chunk)
+            if size > max_bytes:
+                raise _too_large(max_bytes)
+
+            if len(head) < PDF_HEADER_WINDOW:
+                head += chunk[:PDF_HEADER_WINDOW - len(head)]
+                if len(head) >= PDF_HEADER_WINDOW and PDF_MAGIC not in head:
+                    raise HTTPException(status_code=400, detail="File must be a PDF")
+
+            await asyncio.to_thread(_write_chunk, f, sha256, chunk)
+
+        if PDF_MAGIC not in head:
+            raise HTTPException(status_code=400, detail="File must be a PDF")
+
+        await asyncio.to_thread(_finish, f, temp_path, file_path)
+        return sha256.hexdigest()
+
+    except BaseException:
+        # Synchronous on purpose: awaiting here would be interrupted again when the task is being cancelled
+        f.close()
+        _remove_quietly(temp_path)
+        raise
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File exceeds the {max_bytes // (1024 * 1024)} MB limit")
+
+
+def _sniff_pdf(head: bytes, complete: bool) -> Optional[bool]:
+    """
+    Check the start of a multipart body for the file part's PDF header.
+    Returns None while there is not enough of the body to tell.
+    """
+    start = head.find(b"filename=")
+    if start == -1:
+        return False if complete else None
+    end = head.find(b"\r\n\r\n", start)
+    if end == -1:
+        return False if complete else None
+    content = head[end + 4:end + 4 + PDF_HEADER_WINDOW]
+    if PDF_MAGIC in content:
+        return True
+    if len(content) >= PDF_HEADER_WINDOW or complete:
+        return False
+    return None
+
+
+class UploadLimitMiddleware:
+    """
+    Pure ASGI middleware enforcing the upload limits while the request body is still arriving.
+
+    Starlette spools the whole multipart body to a temporary file before the route runs, so
+    save_upload alone only rejects an oversized or non-PDF upload after it has been received.
+    This stops reading as soon as the declared Content-Length, the bytes actually received, or
+    the leading bytes of the file part rule the upload out. The spool itself remains, but never
+    holds more than the limit.
+    """
+
+    def __init__(self, app, path: str = "/pdfs/upload", max_bytes: int = MAX_UPLOAD_BYTES):
+        self.app = app
+        self.path = path
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.max_bytes + MULTIPART_OVERHEAD
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        declared_too_large = content_length.isdigit() and int(content_length) > limit
+        state = {"received": 0, "head": b"", "sniffing": True}
+
+        async def receive_limited():
+            # Raised from inside request.form(), so the route's usual HTTPException handling answers
+            if declared_too_large:
+                logger.warning(f"Rejected upload declaring {int(content_length)} bytes")
+                raise _too_large(self.max_bytes)
+
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+
+            body = message.get("body", b"")
+            state["received"] += len(body)
+            if state["received"] > limit:
+                logger.warning(f"Rejected upload after {state['received']} bytes")
+                raise _too_large(self.max_bytes)
+
+            if state["sniffing"]:
+                state["head"] += body[:UPLOAD_SNIFF_WINDOW - len(state["head"])]
+                verdict = _sniff_pdf(state["head"], complete=not message.get("more_body", False))
+                if verdict is False:
+                    logger.warning(f"Rejected upload without a PDF header after {state['received']} bytes")
+                    raise HTTPException(status_code=400, detail="File must be a PDF")
+                # Undecided after the whole window: leave the check to save_upload
+                state["sniffing"] = verdict is None and len(state["head"]) < UPLOAD_SNIFF_WINDOW
+            return message
+
+        await self.app(scope, receive_limited, send)
@@ -1,46 +1,236 @@
 import os
 import logging
 import asyncio
-from typing import List, Dict, Any, Optional
-import chromadb
-from chromadb.config import Settings
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from cachetools import LRUCache
 
-# Use the new PersistentClient API as per migration guide
-try:
-    from chromadb import PersistentClient
-except ImportError:
-    PersistentClient = None  # fallback for old versions, but should upgrade chromadb
-
-from chromadb.utils import embedding_functions
+from embeddings import get_embedding_engine
+from embedding_batcher import get_embedding_batcher
+from chunking import TextChunker, get_chunker, CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS
+import lexical_index
+from metrics import VECTOR_STORE_SECONDS, timed
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# ChromaDB client
+# Directory where ChromaDB persists collections
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+
+# Threads dedicated to blocking vector store calls, and their timeouts in seconds
+VECTOR_STORE_WORKERS = int(os.getenv("VECTOR_STORE_WORKERS", "4"))
+VECTOR_QUERY_TIMEOUT = float(os.getenv("VECTOR_QUERY_TIMEOUT", "10"))
+VECTOR_WRITE_TIMEOUT = float(os.getenv("VECTOR_WRITE_TIMEOUT", "120"))
+
+# Default retrieval mode: "vector" (dense only) or "hybrid" (dense + BM25, fused with RRF)
+RETRIEVAL_MODES = ("vector", "hybrid")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
+# Candidates taken from each retriever before fusion in hybrid mode
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+# Most collections searched by a single multi-document query
+MAX_PDFS_PER_QUERY = int(os.getenv("MAX_PDFS_PER_QUERY", "8"))
+
+# Number of query embeddings kept in memory
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+
+# ChromaDB client, created once under a lock
 _client = None
+_client_lock = threading.Lock()
+
+# LRU cache of query embeddings, keyed by normalized query text
+_query_embeddings = LRUCache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+_query_embedding_stats = {"hits": 0, "misses": 0}
 
 
 def get_chroma_client():
     """
     Get or create a ChromaDB client using the new PersistentClient API.
+    Thread-safe: the first calls may race from the vector store pool and the warm-up thread.
     """
     global _client
     if _client is None:
+        with _client_lock:
+            if _client is None:
+                try:
+                    # Imported on first use: chromadb takes over a second to import
+                    import chromadb
+                    from chromadb.config import Settings
+
+                    persist_dir = os.path.abspath(CHROMA_PERSIST_DIR)
+                    if hasattr(chromadb, "PersistentClient"):
+                        _client = chromadb.PersistentClient(path=persist_dir)
+                    else:
+                        # Fallback: try old Client API (should upgrade chromadb if this triggers)
+                        _client = chromadb.Client(Settings(
+                            chroma_db_impl="duckdb+parquet",
+                            persist_directory=persist_dir
+                        ))
+                    logger.info("ChromaDB client initialized using new PersistentClient API")
+                except Exception as e:
+                    logger.error(f"Error initializing ChromaDB client: {str(e)}")
+                    raise
+    return _client
+
+def get_embedding_function():
+    """
+    Get the shared embedding function used for document chunks and queries.
+    """
+    return get_embedding_engine()
+
+def get_or_create_collection(document_id: str):
+    """
+    Get the collection for a document, creating it with the shared embedding function if needed.
+    """
+    client = get_chroma_client()
+    collection_name = f"pdf_{document_id}"
+    try:
+        return client.get_collection(collection_name, embedding_function=get_embedding_function())
+    except:
+        return client.create_collection(
+            name=collection_name,
+            embedding_function=get_embedding_function()
+        )
+
+class AsyncVectorStore:
+    """
+    Async interface over the synchronous Chroma client. Every call runs in a dedicated
+    thread pool with a timeout, so HNSW searches and inserts never block the event loop.
+    Calls cancelled or timed out before they start are dropped from the queue; calls already
+    running finish in the background.
+    """
+
+    def __init__(
+        self,
+        workers: int = VECTOR_STORE_WORKERS,
+        query_timeout: float = VECTOR_QUERY_TIMEOUT,
+        write_timeout: float = VECTOR_WRITE_TIMEOUT
+    ):
+        self.query_timeout = query_timeout
+        self.write_timeout = write_timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chroma")
+        self.calls = 0
+        self.timeouts = 0
+        self.cancellations = 0
+
+    async def _run(self, timeout: float, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        self.calls += 1
         try:
-            persist_dir = os.path.abspath("./chroma_db")
-            if PersistentClient:
-                _client = PersistentClient(path=persist_dir)
-            else:
-                # Fallback: try old Client API (should upgrade chromadb if this triggers)
-                _client = chromadb.Client(Settings(
-                    chroma_db_impl="duckdb+parquet",
-                    persist_directory=persist_dir
-                ))
-            logger.info("ChromaDB client initialized using new PersistentClient API")
-        except Exception as e:
-            logger.error(f"Error initializing ChromaDB client: {str(e)}")
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs)),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
             raise
-    return _client
+        except asyncio.CancelledError:
+            self.cancellations += 1
+            raise
+
+    async def get_collection(self, document_id: str):
+        """
+        Get an existing collection, or None if it does not exist.
+        """
+        def get():
+            try:
+                return get_chroma_client().get_collection(f"pdf_{document_id}", embedding_function=get_embedding_function())
+            except:
+                return None
+        
+        return await self._run(self.query_timeout, get)
+
+    async def get_or_create_collection(self, document_id: str):
+        return await self._run(self.write_timeout, get_or_create_collection, document_id)
+
+    async def add(
+        self,
+        document_id: str,
+        ids: List[str],
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict[str, Any]]
+    ) -> None:
+        def add_batch():
+            collection = get_or_create_collection(document_id)
+            collection.add(ids=ids, documents=documents, embeddings=embeddings, metadatas=metadatas)
+        
+        with timed(VECTOR_STORE_SECONDS, "chroma.add", operation="add"):
+            await self._run(self.write_timeout, add_batch)
+
+    async def query(self, collection, query_embedding: List[float], top_k: int) -> Dict[str, Any]:
+        with timed(VECTOR_STORE_SECONDS, "chroma.query", operation="query"):
+            return await self._run(
+                self.query_timeout, collection.query, query_embeddings=[query_embedding], n_results=top_k
+            )
+
+    async def get(self, collection, ids: List[str]) -> Dict[str, Any]:
+        with timed(VECTOR_STORE_SECONDS, "chroma.get", operation="get"):
+            return await self._run(self.query_timeout, collection.get, ids=ids, include=["documents"])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "cancellations": self.cancellations,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_vector_store = None
+
+def get_vector_store() -> AsyncVectorStore:
+    """
+    Get or create the shared async vector store.
+    """
+    global _vector_store
+    if _vector_store is None:
+        _vector_store = AsyncVectorStore()
+    return _vector_store
+
+def shutdown_vector_store() -> None:
+    global _vector_store
+    if _vector_store is not None:
+        _vector_store.shutdown()
+        _vector_store = None
+
+async def embed_query(query: str) -> np.ndarray:
+    """
+    Embed a search query, reusing the embedding of an identical earlier query.
+    """
+    # The embedding model is uncased, so case and spacing do not change the vector
+    key = " ".join(query.lower().split())
+    embedding = _query_embeddings.get(key)
+    if embedding is not None:
+        _query_embedding_stats["hits"] += 1
+        return embedding
+    
+    _query_embedding_stats["misses"] += 1
+    embedding = (await get_embedding_batcher().embed([query]))[0]
+    _query_embeddings[key] = embedding
+    return embedding
+
+def get_query_embedding_cache_stats() -> Dict[str, Any]:
+    return {"entries": len(_query_embeddings), **_query_embedding_stats}
+
+async def add_chunks_to_chroma(
+    document_id: str,
+    chunks: List[str],
+    ids: List[str],
+    metadatas: List[Dict[str, Any]]
+) -> None:
+    """
+    Embed and add a batch of chunks to a document's collection.
+    """
+    if not chunks:
+        return
+    
+    embeddings = await get_embedding_batcher().embed(chunks)
+    await get_vector_store().add(document_id, ids, chunks, embeddings.tolist(), metadatas)
 
 async def add_document_to_chroma(
     document_id: str,
@@ -51,32 +241,15 @@ async def add_document_to_chroma(
     Add a document to ChromaDB.
     """
     try:
-        client = get_chroma_client()
-        
-        # Split text into chunks (max 1000 tokens per chunk)
-        chunks = split_text(text, max_tokens=1000)
+        # Split text into chunks that fit the embedding model
+        chunks = split_text(text)
         
-        # Create collection if it doesn't exist
+        # Add chunks to collection, creating it if it doesn't exist
         collection_name = f"pdf_{document_id}"
-        try:
-            collection = client.get_collection(collection_name)
-        except:
-            # Use default embedding function
-            default_ef = embedding_functions.DefaultEmbeddingFunction()
-            collection = client.create_collection(
-                name=collection_name,
-                embedding_function=default_ef
-            )
-        
-        # Add chunks to collection
         ids = [f"{document_id}_{i}" for i in range(len(chunks))]
         metadatas = [metadata or {} for _ in range(len(chunks))]
         
-        collection.add(
-            ids=ids,
-            documents=chunks,
-            metadatas=metadatas
-        )
+        await add_chunks_to_chroma(document_id, chunks, ids, metadatas)
         
         logger.info(f"Added {len(chunks)} chunks to collection {collection_name}")
     
@@ -84,67 +257,118 @@ async def add_document_to_chroma(
         logger.error(f"Error adding document to ChromaDB: {str(e)}")
         raise
 
+async def _hybrid_query(store: AsyncVectorStore, collection, document_id: str, query: str, query_embedding: List[float], top_k: int) -> List[Tuple[float, str]]:
+    """
+    Fuse dense and BM25 rankings with reciprocal-rank fusion and return the top_k (score, document) pairs.
+    """
+    candidates = max(top_k, HYBRID_CANDIDATES)
+    dense, lexical = await asyncio.gather(
+        store.query(collection, query_embedding, candidates),
+        asyncio.to_thread(lexical_index.search, document_id, query, candidates)
+    )
+    dense_ids = dense.get("ids", [[]])[0]
+    documents = dict(zip(dense_ids, dense.get("documents", [[]])[0]))
+    
+    fused = lexical_index.reciprocal_rank_fusion([dense_ids, [chunk_id for chunk_id, _ in lexical]])[:top_k]
+    
+    # Chunks found only by the lexical index still have to be read from the collection
+    missing = [chunk_id for chunk_id, _ in fused if chunk_id not in documents]
+    if missing:
+        fetched = await store.get(collection, missing)
+        documents.update(zip(fetched.get("ids", []), fetched.get("documents", [])))
+    
+    return [(score, documents[chunk_id]) for chunk_id, score in fused if chunk_id in documents]
+
+async def _query_collection(
+    store: AsyncVectorStore,
+    document_id: str,
+    query: str,
+    query_embedding: List[float],
+    top_k: int,
+    mode: str
+) -> List[Tuple[float, str]]:
+    """
+    Query one document's collection and return (score, document) pairs, higher scores first.
+    Scores are comparable across collections queried in the same mode.
+    """
+    collection = await store.get_collection(document_id)
+    if collection is None:
+        logger.error(f"Collection pdf_{document_id} not found")
+        return []
+    
+    if mode == "hybrid":
+        return await _hybrid_query(store, collection, document_id, query, query_embedding, top_k)
+    
+    # Embeddings are normalized, so distances rank the same way in every collection
+    results = await store.query(collection, query_embedding, top_k)
+    documents = results.get("documents", [[]])[0]
+    distances = results.get("distances", [[]])[0]
+    return [(-distance, document) for distance, document in zip(distances, documents)]
+
+async def query_documents(
+    document_ids: List[str],
+    query: str,
+    top_k: int = 3,
+    mode: Optional[str] = None,
+    failed: Optional[List[str]] = None
+) -> List[Tuple[str, str]]:
+    """
+    Query several documents' collections in parallel and merge their hits into one global top_k.
+    Returns (document_id, chunk) pairs, best first. At most MAX_PDFS_PER_QUERY collections are searched.
+    Ids of collections that could not be queried are appended to `failed`; if none could, the error is raised.
+    """
+    document_ids = list(dict.fromkeys(document_ids))[:MAX_PDFS_PER_QUERY]
+    if not document_ids:
+        return []
+    
+    store = get_vector_store()
+    mode = mode or RETRIEVAL_MODE
+    
+    # Embed the query once (cached, or batched with other concurrent requests)
+    query_embedding = (await embed_query(query)).tolist()
+    
+    results = await asyncio.gather(
+        *(_query_collection(store, document_id, query, query_embedding, top_k, mode) for document_id in document_ids),
+        return_exceptions=True
+    )
+    
+    hits = []
+    errors = []
+    for document_id, result in zip(document_ids, results):
+        if isinstance(result, BaseException):
+            logger.error(f"Error querying collection pdf_{document_id}: {str(result)}")
+            errors.append(result)
+            if failed is not None:
+                failed.append(document_id)
+            continue
+        hits.extend((score, document_id, document) for score, document in result)
+    if len(errors) == len(document_ids):
+        raise errors[0]
+    
+    hits.sort(key=lambda hit: hit[0], reverse=True)
+    return [(document_id, document) for _, document_id, document in hits[:top_k]]
+
 async def query_chroma(
     document_id: str,
     query: str,
-    top_k: int = 3
+    top_k: int = 3,
+    mode: Optional[str] = None
 ) -> List[str]:
     """
     Query ChromaDB for relevant document chunks.
+    `mode` is "vector" or "hybrid"; defaults to RETRIEVAL_MODE.
     """
     try:
-        client = get_chroma_client()
-        collection_name = f"pdf_{document_id}"
-        
-        try:
-            collection = client.get_collection(collection_name)
-        except:
-            logger.error(f"Collection {collection_name} not found")
-            return []
-        
-        # Query collection
-        results = collection.query(
-            query_texts=[query],
-            n_results=top_k
-        )
-        
-        # Extract documents
-        documents = results.get("documents", [[]])[0]
-        
-        return documents
+        return [document for _, document in await query_documents([document_id], query, top_k, mode)]
     
     except Exception as e:
         logger.error(f"Error querying ChromaDB: {str(e)}")
         return []
 
-def split_text(text: str, max_tokens: int = 1000) -> List[str]:
+def split_text(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> List[str]:
     """
-    Split text into chunks of approximately max_tokens.
-    This is a simple implementation that splits by paragraphs and then combines them.
+    Split text into chunks of at most max_tokens embedding-model tokens, with overlap.
     """
-    # Split by paragraphs
-    paragraphs = [p for p in text.split("\n\n") if p.strip()]
-    
-    chunks = []
-    current_chunk = []
-    current_size = 0
-    
-    for paragraph in paragraphs:
-        # Rough estimate: 1 token ~= 4 characters
-        paragraph_size = len(paragraph) // 4
-        
-        if current_size + paragraph_size > max_tokens and current_chunk:
-            # Add current chunk to chunks and start a new one
-            chunks.append("\n\n".join(current_chunk))
-            current_chunk = [paragraph]
-            current_size = paragraph_size
-        else:
-            # Add paragraph to current chunk
-            current_chunk.append(paragraph)
-            current_size += paragraph_size
-    
-    # Add the last chunk if it's not empty
-    if current_chunk:
-        chunks.append("\n\n".join(current_chunk))
-    
-    return chunks
+    if max_tokens == CHUNK_MAX_TOKENS and overlap_tokens == CHUNK_OVERLAP_TOKENS:
+        return get_chunker().split(text)
+    return TextChunker(max_tokens, overlap_tokens).split(text)